@@ -1,13 +1,22 @@
+import asyncio
 import re
+import time
+from array import array
+from collections import deque
+from types import MappingProxyType
 
-def setup():
+def setup(merge_rules=True, tag_phrases=False):
 
     # 把json转换为python字典
     general_script = general_json
     script = doctor_json
     
-    # 
-    script = process_decomp_rules(script, general_script['tags'])
+    # 把分解规则编译为正则对象（生成新的规则，不修改doctor_json，setup可以重复调用）
+    # merge_rules=True 时同一关键词的规则合并为一个带命名分组的正则
+    script = process_decomp_rules(script, general_script['tags'], merge_rules)
+    # 建立关键词索引和关键词自动机，之后的查找都通过它们完成
+    # tag_phrases=True 时标签里的多词短语（如 "no one"）也会被识别为同一标签中的关键词
+    script = CompiledScript(script, general_script['tags'] if tag_phrases else None)
     
     # 内存输入和退出输入
     memory_inputs = general_script['memory_inputs']
@@ -15,60 +24,240 @@ def setup():
 
     return general_script, script, memory_inputs, exit_inputs
 
-def decompose(keyword, in_str, script):
+class KeywordAutomaton:
+    # 以单词为字母表的Aho-Corasick自动机：一次线性扫描找出句子中所有的关键词和多词短语
+    # 扫描时间只和输入长度及匹配数有关，与关键词数量无关
+    def __init__(self, phrases):
+        # phrases: (短语的单词元组, 对应的关键词)
+        self.goto = [{}]
+        self.out = [()]
+        for words, keyword in phrases:
+            state = 0
+            for w in words:
+                nxt = self.goto[state].get(w)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[state][w] = nxt
+                    self.goto.append({})
+                    self.out.append(())
+                state = nxt
+            self.out[state] += ((len(words), keyword),)
+        # 按层（BFS）计算失败链接，并把失败状态的输出并入当前状态
+        self.fail = [0] * len(self.goto)
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for w, nxt in self.goto[state].items():
+                queue.append(nxt)
+                f = self.fail[state]
+                while f and w not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(w, 0)
+                self.out[nxt] += self.out[self.fail[nxt]]
+
+    def find(self, tokens):
+        # 依次产生(结束位置, 短语长度, 关键词)，按结束位置排序，同一位置较长的短语在前
+        goto, fail, out = self.goto, self.fail, self.out
+        state = 0
+        for i, w in enumerate(tokens):
+            while state and w not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(w, 0)
+            for length, keyword in out[state]:
+                yield i, length, keyword
+
+class CompiledScript:
+    # 编译后的脚本：关键词 -> 条目（包含rank和rules）的字典索引
+    # 每次查找是O(1)，不再随脚本大小线性增长
+    # 条目和规则都是只读的，所有会话共享同一个CompiledScript，会话自己的状态在Session中
+    def __init__(self, entries, tags=None):
+        self.entries = tuple(entries)
+        self.index = {}
+        for d in entries:
+            # 和原来的线性查找一致：关键词重复时以第一个条目为准
+            self.index.setdefault(d['keyword'], d)
+        # 关键词（可以是多个单词）及可选的标签短语 -> 自动机
+        phrases = [(tuple(keyword.split()), keyword) for keyword in self.index]
+        for members in (tags or {}).values():
+            keywords = [m for m in members if m in self.index]
+            phrases += [(tuple(m.split()), k) for m in members if ' ' in m for k in keywords]
+        self.automaton = KeywordAutomaton(phrases)
+        # 所有出现过的rank，从高到低
+        self.rank_order = sorted({d['rank'] for d in self.index.values()}, reverse=True)
+        # 每条规则（按rule['id']）第一次使用的回答编号，新会话从这里复制一份
+        self.first_answers = array('H', [rule['last_used_answer_rule']
+                                         for d in self.entries for rule in d['rules']])
+
+    def lookup(self, keyword):
+        # 没有该关键词时返回None
+        return self.index.get(keyword)
+
+    def spot(self, tokens):
+        # 找出小写单词列表中的全部关键词，按rank从高到低排列；
+        # rank相同的按在句子中（结束）的位置排列，与原来的稳定排序一致
+        buckets = {}
+        for _, _, keyword in self.automaton.find(tokens):
+            rank = self.index[keyword]['rank']
+            if rank in buckets:
+                buckets[rank].append(keyword)
+            else:
+                buckets[rank] = [keyword]
+        if len(buckets) <= 1:
+            return next(iter(buckets.values()), [])
+        return [k for rank in self.rank_order if rank in buckets for k in buckets[rank]]
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+class Session:
+    # 一个对话自己的状态：每条规则下次使用的回答编号（按rule['id']，每条规则2字节）和内存栈
+    __slots__ = ('answer_ids', 'memory_stack')
+
+    def __init__(self, script):
+        self.answer_ids = array('H', script.first_answers)
+        self.memory_stack = []
+
+def decompose(keyword, in_str, script, session):
     #初始化单词列表和查询到的标准答案
     comps = []
     answer_rule = ''
 
-    # 遍历预定义的字典
-    for d in script: 
-        if d['keyword'] == keyword:
-            # 遍历关键词的分解规则
-            for rule in d['rules']:
-                # 匹配分解规则
-                m = re.match(rule['decomp'], in_str, re.IGNORECASE)
-                if m:
-                    # 按照分解规则分解输入
-                    comps = list(m.groups())
-                    answer_rule = rule['answer'][rule['last_used_answer_rule']]
-                    #下次回复用的答案id+1
-                    next_id = rule['last_used_answer_rule']+1
-                    #如果下一个id超出了回复的种类，则回到0
-                    if next_id >= len(rule['answer']):
-                        next_id = 0
-                    rule['last_used_answer_rule'] = next_id
-                    break
-            break
+    # 通过索引找到关键词对应的条目
+    d = script.lookup(keyword)
+    if d is not None:
+        # 找到第一个匹配的分解规则，并按照它分解输入
+        rule, comps = match_rule(d, in_str)
+        if rule is not None:
+            # 回答的轮换记录在会话中，共享的规则本身不修改
+            answer_ids = session.answer_ids
+            answer_id = answer_ids[rule['id']]
+            answer_rule = rule['answer'][answer_id]
+            #下次回复用的答案id+1
+            next_id = answer_id+1
+            #如果下一个id超出了回复的种类，则回到0
+            if next_id >= len(rule['answer']):
+                next_id = 0
+            answer_ids[rule['id']] = next_id
     return comps, answer_rule
 
-def reassemble(components, answer_rule):
-    #初始化回答
-    response = 'Eliza: '
-    #将查询得到的标准答案分解为多个单词
-    answer_rule = answer_rule.split() 
+# 紧贴前一个单词的标点（对应原来的 re.sub(r'\s([?.!"](?:\s|$))', r'\1', ...)）
+ATTACHED_PUNCT = frozenset('?.!"')
 
-    #遍历单词列表
-    for comp in answer_rule:
-        #如果是数字，则是在回答中添加之前分解的词语列表中该索引-1的词语
-        if comp.isnumeric():
-            response += components[int(comp)-1] + ' '
+def compile_answer(answer):
+    # 把回答预先拆分为模板：整数n表示分解结果中下标为n的词语，其余是原样输出的单词
+    return tuple(int(w)-1 if w.isnumeric() else w for w in answer.split())
+
+def reassemble(components, answer_rule):
+    #初始化回答，answer_rule是compile_answer得到的模板
+    words = ['Eliza:']
+    for part in answer_rule:
+        #如果是整数，则是在回答中添加分解得到的该下标的词语（按空白拆开）
+        if isinstance(part, int):
+            words.extend(components[part].split())
         #否则在回答中直接添加该单词
         else:
-            response += comp + ' '
+            words.append(part)
+
+    # 一次拼接完成：单词之间一个空格，单独的 ? . ! " 紧贴前一个单词
+    # （和原来的正则一样，紧贴之后的下一个标点不再紧贴）
+    pieces = [words[0]]
+    attached = False
+    for w in words[1:]:
+        if not attached and w in ATTACHED_PUNCT:
+            attached = True
+        else:
+            pieces.append(' ')
+            attached = False
+        pieces.append(w)
+    return ''.join(pieces)
 
-    # 删除尾部的空格
-    response = response[:-1]
+# 删除除字母数字、空白、'以外的字符（句子分隔符 . , ! ? 先保留）
+STRIP_CHARS = re.compile(r"[^\w\s'.,!?]")
+# 句子分隔符
+SENTENCE_END = re.compile(r"[.,!?]")
 
-    return response
+def tokenize(in_str, substitutions):
+    # 每个输入只切分一次：删除标点、按句子切分、小写化和替换在同一遍中完成
+    # 依次产生每个非空句子的(单词列表, 小写单词列表)
+    # 输入末尾的分隔符后面不会再有单词，所以和原来的 [.,!?](?!$) 切分结果一致
+    for sentence in SENTENCE_END.split(STRIP_CHARS.sub('', in_str)):
+        words = sentence.split()
+        if not words:
+            continue
+        # 整句小写后再拆分（小写化不会产生或去掉空白，和逐词小写一一对应）
+        lowers = sentence.lower().split()
+        out_words, out_lowers = [], []
+        for word, low in zip(words, lowers):
+            sub = substitutions.get(low)
+            # 如果与需替换的词匹配到，则替换为需要的词（可能是多个单词）
+            if sub is None:
+                out_words.append(word)
+                out_lowers.append(low)
+            else:
+                for w in sub.split():
+                    out_words.append(w)
+                    out_lowers.append(w.lower())
+        yield out_words, out_lowers
 
-def process_decomp_rules(script, tags):
+def match_rule(d, in_str):
+    # 返回第一个匹配的规则和分解得到的词语列表；都不匹配时返回(None, [])
+    merged = d['merged']
+    if merged is not None:
+        # 一次匹配找到第一个匹配的规则：最外层的命名分组最后闭合，lastgroup就是规则编号
+        m = merged.match(in_str)
+        if m:
+            i = int(m.lastgroup[1:])
+            start, n = d['spans'][i]
+            return d['rules'][i], list(m.groups()[start:start + n])
+        return None, []
+    for rule in d['rules']:
+        # 匹配分解规则
+        m = rule['pattern'].match(in_str)
+        if m:
+            return rule, list(m.groups())
+    return None, []
+
+def build_tag_patterns(tags):
+    # 标签名 -> 正则字符串 (形如 \b(x|y|z)\b)，只拼接一次，供各条分解规则嵌入
+    return {name: tag_to_regex(name, tags) for name in tags}
+
+def process_decomp_rules(script, tags, merge_rules=True):
+    tag_patterns = build_tag_patterns(tags)
+    compiled = []
+    # 规则在整个脚本中的编号，会话按它记录回答的轮换
+    rule_id = 0
     # 遍历字典
     for d in script:
+        rules = []
         # 遍历规则
         for rule in d['rules']:
-            # 将分解规则转换为正则表达式
-            rule['decomp'] = decomp_to_regex(rule['decomp'], tags) 
-    return script
+            # 将分解规则转换为正则表达式并编译
+            decomp = decomp_to_regex(rule['decomp'], tag_patterns)
+            # 规则是只读视图；last_used_answer_rule只是新会话的初始值
+            rules.append(MappingProxyType({'id': rule_id, 'decomp': decomp,
+                                           'pattern': re.compile(decomp, re.IGNORECASE),
+                                           'answer': tuple(compile_answer(a) for a in rule['answer']),
+                                           'last_used_answer_rule': rule['last_used_answer_rule']}))
+            rule_id += 1
+        entry = {'keyword': d['keyword'], 'rank': d['rank'], 'rules': tuple(rules),
+                 'merged': None, 'spans': None}
+        if merge_rules and len(rules) > 1:
+            # 合并为 (?P<r0>...)|(?P<r1>...)|...，spans记录每条规则的分组在groups()中的位置
+            spans = []
+            start = 0
+            for rule in rules:
+                n = rule['pattern'].groups
+                spans.append((start + 1, n))
+                start += n + 1
+            entry['merged'] = re.compile('|'.join('(?P<r%d>%s)' % (i, rule['decomp'])
+                                                  for i, rule in enumerate(rules)),
+                                         re.IGNORECASE)
+            entry['spans'] = tuple(spans)
+        compiled.append(MappingProxyType(entry))
+    return compiled
 
 def preprocess_decomp_rule(in_str):
     # 形如(0 YOU 0)
@@ -103,7 +292,8 @@ def regexify(w, tags):
     elif w[0] == "@":
         # Get tag name
         tag_name = w[1:].lower()
-        w = tag_to_regex(tag_name, tags)
+        # tags 是标签的正则字符串（见build_tag_patterns）
+        w = tags.get(tag_name, '')
     else:
         # 加上单词的界限\b
         w = r'\b' + w + r'\b'
@@ -116,87 +306,50 @@ def tag_to_regex(tag_name, tags):
         w = r'\b(' + '|'.join(tags[tag_name]) + r')\b'
     return w
 
-def generate_response(in_str, script, substitutions, memory_stack, memory_inputs):
-    # 将输入分解为标点符号分隔的句子
-    sentences = re.split(r'[.,!?](?!$)', in_str)
+# 每条回复后的换行和输入提示符
+PROMPT = "\nYou: "
+
+def generate_response(in_str, script, substitutions, session, memory_inputs):
+    # 将输入分解为标点符号分隔的句子（单词已经替换）
+    sentences = tokenize(in_str, substitutions)
 
     # 获取输入中排名最高的单词的句子，并按排名对关键字进行排序
-    sentence, sorted_keywords = retrieve(sentences, script, substitutions)
+    sentence, sorted_keywords = retrieve(sentences, script)
     # 查找匹配的分解规则
     for keyword in sorted_keywords:
-        comps, answer_rule = decompose(keyword, sentence, script)
+        comps, answer_rule = decompose(keyword, sentence, script, session)
         if comps:
             response = reassemble(comps, answer_rule)
             #如果关键词为预定义的内存输入，将生成存入栈的回复答案
             if keyword in memory_inputs:
-                    mem_comps, mem_answer_rule = decompose('^', sentence, script)
+                    mem_comps, mem_answer_rule = decompose('^', sentence, script, session)
                     mem_response = reassemble(mem_comps, mem_answer_rule)
-                    memory_stack.append(mem_response)
+                    session.memory_stack.append(mem_response)
             break
     # 没有找到匹配的分解规则
     else:
         # 如果内存堆栈不为空，就从栈中pop出回答
-        if memory_stack:
-            response = memory_stack.pop()
+        if session.memory_stack:
+            response = session.memory_stack.pop()
         # 最后，实在匹配不到，给出通用答案
         else:
-            comps, answer_rule = decompose('$', '$', script)
+            comps, answer_rule = decompose('$', '$', script, session)
             response = reassemble(comps, answer_rule)
-    #去掉多余空格
-    response = ' '.join(response.split())
-    #去掉标点符号
-    response = re.sub(r'\s([?.!"](?:\s|$))', r'\1', response)
-    #加上换行和前缀
-    response += "\nYou: "
+    #加上换行和前缀（多余空格和标点在reassemble中已经处理）
+    response += PROMPT
     return response
 
-def retrieve(sentences, script, substitutions):
-
-    # 遍历所有输入语句
-    for i in range(0, len(sentences)):
-        # 删除标点符号
-        sentences[i] = re.sub(r'[^\w\s\']', '', sentences[i])
-        # 替换关键词
-        sentences[i] = replace(sentences[i], substitutions)
-
-        if sentences[i]:
-            #分解语句为词语
-            keywords = sentences[i].lower().split()
-            
-            #初始化分数列表和判断标志
-            ranks = []
-            flag = False
+def retrieve(sentences, script):
 
-            # 遍历关键词与预先记录的关键词进行匹配，查到其分数。
-            for keyword in keywords:
-                for d in script:
-                    if d['keyword'] == keyword:
-                        ranks.append(d['rank'])
-                        flag = True
-                        break
-                # 如果没匹配到，记为0分。
-                else:
-                    ranks.append(0)
-            if flag:
-                #将关键词和排名两个列表合为一个元组的列表，每个元组中包含一对（关键词，排名）
-                sorted_keywords = [x for _,x in sorted(zip(ranks, keywords), key=lambda pair: pair[0], reverse=True)]
-                return  sentences[i],sorted_keywords
+    # 遍历tokenize得到的所有句子，返回第一个含有关键词的句子
+    for words, lowers in sentences:
+        # 自动机一次扫描找出全部关键词，已按rank从高到低排好
+        sorted_keywords = script.spot(lowers)
+        if sorted_keywords:
+            # 分解规则匹配的是替换后的句子（末尾保留一个空格，与原来一致）
+            return ' '.join(words) + ' ', sorted_keywords
     return None, []
 
-def replace(in_sentence, substitutions):
-    out_sentence = ''
-
-    # 遍历
-    for word in in_sentence.split():
-        # 如果与需替换的词匹配到，则替换为需要的词
-        if word.lower() in substitutions:
-            out_sentence += substitutions[word.lower()] + ' '
-        # 否则还是加原来的词
-        else:
-            out_sentence += word + ' '
-
-    return out_sentence
-
 general_json = {
     "substitutions": {
         "you": "I",
@@ -1140,29 +1293,151 @@ doctor_json = [
 ]
 
 
+def converse(in_str, general_script, script, session):
+    # 一轮对话：返回带提示符的回复；用户要结束对话时返回None
+    in_str_l = in_str.lower()
+    if in_str_l in general_script['exit_inputs']:
+        return None
+    if not in_str_l.islower():
+        return 'Eliza: Please, use letters. I am human, after all.' + PROMPT
+    return generate_response(in_str, script, general_script['substitutions'], session,
+                             general_script['memory_inputs'])
+
 def main():
-    memory_stack = []
     #从json文件中加载需要的字典
     general_script, script, memory_inputs, exit_inputs = setup()
+    # 命令行里只有一个会话
+    session = Session(script)
 
     #获取用户的首次输入
-    in_str = input("Eliza: Welcome.\nYou: ")
-    in_str_l = in_str.lower()
+    response = "Eliza: Welcome." + PROMPT
+    while True:
+        in_str = input(response)
+        response = converse(in_str, general_script, script, session)
+        if response is None:
+            break
 
-    while in_str_l not in exit_inputs:
+    print("Eliza: Goodbye.\n")
 
-        if not in_str_l.islower():
-            response = ('Eliza: Please, use letters. I am human, after all.')
-            #加上换行和前缀
-            response += "\nYou: "
-        else:
-            response = generate_response(in_str, script, general_script['substitutions'], memory_stack, memory_inputs)
+async def handle_connection(reader, writer, general_script, script, latencies=None):
+    # 每个连接是一个会话；按行收发，每条回复一行（不带"You: "提示符）
+    # 脚本只读共享，连接之间只有各自的Session不同
+    session = Session(script)
+    writer.write(b"Eliza: Welcome.\n")
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            t0 = time.perf_counter()
+            response = converse(line.decode('utf-8', 'replace').rstrip('\r\n'),
+                                general_script, script, session)
+            if response is None:
+                writer.write(b"Eliza: Goodbye.\n")
+                break
+            writer.write(response[:-len(PROMPT)].encode() + b"\n")
+            if latencies is not None:
+                latencies.append(time.perf_counter() - t0)
+            await writer.drain()
+        await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
 
-        #获取用户的下次输入
-        in_str = input(response)
-        in_str_l = in_str.lower()
+async def start_server(general_script, script, host='127.0.0.1', port=8765, path=None,
+                       latencies=None):
+    # path不为None时监听Unix套接字，否则监听TCP；backlog放大以便同时接入上千个连接
+    def handler(reader, writer):
+        return handle_connection(reader, writer, general_script, script, latencies)
+    if path is not None:
+        return await asyncio.start_unix_server(handler, path=path, backlog=4096)
+    return await asyncio.start_server(handler, host, port, backlog=4096)
 
-    print("Eliza: Goodbye.\n")
+async def serve(host='127.0.0.1', port=8765, path=None):
+    general_script, script, memory_inputs, exit_inputs = setup()
+    server = await start_server(general_script, script, host, port, path)
+    print("Eliza: listening on", path or "%s:%d" % (host, port))
+    async with server:
+        await server.serve_forever()
+
+# 压测客户端轮流发送的输入
+LOAD_INPUTS = (
+    "Hello there",
+    "I am feeling sad today",
+    "My mother does not understand me",
+    "I dream about flying over the sea",
+    "Why don't you help me?",
+    "Perhaps I need a holiday",
+    "You are not very helpful",
+    "I remember my first dog",
+    "Everybody hates me",
+    "Can you think about your computer?",
+    "I want to be happy. I wish I could sleep",
+    "the sky is blue",
+)
+
+async def load_client(n_messages, offset, latencies, host, port, path):
+    # 一个会话：发送一条，等回复后再发下一条，记录每条的往返时间
+    if path is not None:
+        reader, writer = await asyncio.open_unix_connection(path)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+    await reader.readline()
+    for i in range(n_messages):
+        msg = LOAD_INPUTS[(offset + i) % len(LOAD_INPUTS)]
+        t0 = time.perf_counter()
+        writer.write(msg.encode() + b"\n")
+        await writer.drain()
+        await reader.readline()
+        latencies.append(time.perf_counter() - t0)
+    writer.write(b"bye\n")
+    await reader.readline()
+    writer.close()
+    await writer.wait_closed()
+
+def percentiles(samples, qs=(50, 90, 99)):
+    # 最近秩法的百分位数，单位毫秒
+    s = sorted(samples)
+    return {q: s[min(len(s) - 1, len(s) * q // 100)] * 1000 for q in qs}
 
+async def load_test(n_sessions, n_messages, host='127.0.0.1', port=0, path=None):
+    # 在同一进程中启动服务器，再开n_sessions个并发会话，各发n_messages条输入
+    # 报告客户端往返时间和服务器处理时间的百分位数
+    general_script, script, memory_inputs, exit_inputs = setup()
+    engine = []
+    server = await start_server(general_script, script, host, port, path, engine)
+    if path is None:
+        port = server.sockets[0].getsockname()[1]
+    round_trip = []
+    t0 = time.perf_counter()
+    async with server:
+        await asyncio.gather(*(load_client(n_messages, i, round_trip, host, port, path)
+                               for i in range(n_sessions)))
+    elapsed = time.perf_counter() - t0
+    print("sessions=%d messages=%d time=%.2fs throughput=%.0f msg/s"
+          % (n_sessions, len(round_trip), elapsed, len(round_trip) / elapsed))
+    for name, samples in (("round trip", round_trip), ("engine", engine)):
+        p = percentiles(samples)
+        print("%-10s p50=%.3fms p90=%.3fms p99=%.3fms max=%.3fms"
+              % (name, p[50], p[90], p[99], max(samples) * 1000))
+
+# python eliza.py                     命令行对话
+# python eliza.py --serve [--unix P]  多会话服务器（例如 nc 127.0.0.1 8765 连接）
+# python eliza.py --bench 2000 20     2000个并发会话的压测
 if __name__=="__main__":
-   main()
+   import argparse
+
+   parser = argparse.ArgumentParser()
+   parser.add_argument('--serve', action='store_true')
+   parser.add_argument('--bench', type=int, nargs=2, metavar=('SESSIONS', 'MESSAGES'))
+   parser.add_argument('--host', default='127.0.0.1')
+   parser.add_argument('--port', type=int, default=8765)
+   parser.add_argument('--unix', metavar='PATH')
+   args = parser.parse_args()
+   if args.bench:
+      asyncio.run(load_test(*args.bench, host=args.host, path=args.unix))
+   elif args.serve:
+      asyncio.run(serve(args.host, args.port, args.unix))
+   else:
+      main()
@@ -0,0 +1,90 @@
+# Solver state for checkpoint / resume and warm starts.
+# A SolverState holds everything the next iteration needs: the iterate x, the
+# index k of the next iteration, the trust radius (tr_dogleg) and the
+# quasi-Newton memory (bfgs / lbfgs), and the last accepted (alpha, slope) that the
+# interpolating line searches scale their first trial step from. Resuming from it with the same options
+# reproduces the remaining iterations exactly:
+#   ckpt = Checkpointer("run.npz", every=50)
+#   tr_dogleg(x0, checkpoint=ckpt)                      # preempted somewhere
+#   tr_dogleg(None, state=SolverState.load("run.npz"))  # continues from the file
+# warm() keeps x / Delta / the QN memory but restarts the count, e.g. for the next
+# value of a in a continuation sweep:
+#   tr_dogleg(None, a=10.0, state=ckpt.state.warm())
+import os
+
+import numpy as np
+
+class SolverState:
+    def __init__(self, solver, x, k=0, Delta=None, qn=None, step=None):
+        self.solver = solver
+        self.x = np.array(x, dtype=float)
+        self.k = int(k)
+        self.Delta = None if Delta is None else float(Delta)
+        self.qn = qn
+        self.step = None if step is None else (float(step[0]), float(step[1]))
+
+    def __repr__(self):
+        return (f"SolverState(solver={self.solver!r}, k={self.k}, x={self.x}, "
+                f"Delta={self.Delta}, qn={None if self.qn is None else sorted(self.qn)})")
+
+    def warm(self):
+        return SolverState(self.solver, self.x, 0, self.Delta, self.qn, self.step)
+
+    def to_arrays(self):
+        arrays = {"solver": np.array(self.solver), "k": np.array(self.k), "x": self.x,
+                  "Delta": np.array(np.nan if self.Delta is None else self.Delta)}
+        if self.step is not None:
+            arrays["step"] = np.array(self.step)
+        for key, val in (self.qn or {}).items():
+            arrays["qn_" + key] = np.asarray(val)
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        Delta = float(arrays["Delta"])
+        qn = {key[3:]: arrays[key] for key in arrays if key.startswith("qn_")}
+        step = arrays.get("step")
+        return cls(str(arrays["solver"]), arrays["x"], int(arrays["k"]),
+                   None if np.isnan(Delta) else Delta, qn or None,
+                   None if step is None else tuple(step))
+
+    # Written to a temporary file and renamed, so a kill mid-write keeps the old checkpoint
+    def save(self, path):
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as fh:
+            np.savez(fh, **self.to_arrays())
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls.from_arrays({key: data[key] for key in data.files})
+
+# (k, x, Delta, qn) a solver starts from; x0 is only used without a state.
+# A warm state (k == 0) may come from another solver: then only x (and Delta) carry over.
+def starting_point(state, x0, solver):
+    if state is None:
+        return 0, np.array(x0, dtype=float).reshape(-1), None, None
+    same = state.solver == solver
+    if state.k and not same:
+        raise ValueError(f"state of {state.solver!r} cannot resume {solver!r}; use state.warm()")
+    return state.k, state.x.copy(), state.Delta, state.qn if same else None
+
+class Checkpointer:
+    # Receives the state every `every` iterations and when the solver returns;
+    # `state` is the latest one (the final state after the run). With path=None
+    # nothing is written and the object just hands the final state back.
+    def __init__(self, path=None, every=100):
+        self.path = path
+        self.every = int(every)
+        self.state = None
+        self.saves = 0
+
+    def due(self, k):
+        return k % self.every == 0
+
+    def save(self, state):
+        self.state = state
+        if self.path is not None:
+            state.save(self.path)
+            self.saves += 1
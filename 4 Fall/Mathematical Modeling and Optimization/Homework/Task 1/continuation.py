@@ -0,0 +1,102 @@
+# Parameter continuation in the Rosenbrock curvature a: one solve per value of a
+# ladder, each warm-started from the previous solution (checkpoint.SolverState.warm(),
+# so tr_dogleg also inherits the trust radius and BFGS its inverse Hessian).
+#   table = solve_ladder(np.geomspace(1, 1e4, 9), (-1.2, 1.0), subproblem="exact")
+#   table = run_ladders({"up": [1, 10, 100], "down": [100, 10, 1]}, (-1.2, 1.0))
+# Whole ladders run in worker processes, so one interpreter (imports, warm state)
+# serves every a of a ladder. Each a gets a fresh oracle: f depends on a, so cached
+# values cannot carry over from one rung to the next.
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from checkpoint import Checkpointer
+from experiment_runner import summarize
+from rosenbrock_linesearch import bfgs, lbfgs, newton_method, steepest_descent
+from tr_dogleg_rosenbrock import rosen_oracle, tr_dogleg
+
+SOLVERS = {"TR": tr_dogleg, "SD": steepest_descent, "NM": newton_method,
+           "BFGS": bfgs, "L-BFGS": lbfgs}
+
+# Cost per a as a DataFrame (one row per rung, in ladder order). warm=False solves
+# every a from x0 instead, as a baseline. make_oracle(a) must give the oracle for
+# one value of a (e.g. rosenbrock_nd.rosen_nd_oracle); kw go to the solver.
+def solve_ladder(a_values, x0, solver="TR", make_oracle=rosen_oracle, warm=True, **kw):
+    import pandas as pd
+    fn = SOLVERS[solver]
+    state = None
+    rows = []
+    for step, a in enumerate(a_values):
+        oracle = make_oracle(a)
+        ckpt = Checkpointer()
+        stats = {} if solver == "TR" else None
+        extra = {} if stats is None else {"stats": stats}
+        t0 = time.perf_counter()
+        result = fn(x0 if state is None else None, oracle=oracle, state=state,
+                    checkpoint=ckpt, **extra, **kw)
+        row = {"step": step, "a": float(a), "time": time.perf_counter() - t0}
+        row.update(summarize(result))
+        row["x*"] = tuple(ckpt.state.x.tolist())
+        row.update({key: val for key, val in oracle.counters().items()
+                    if key in ("nfev", "ngev", "nhev")})
+        if stats:
+            row.update(stats)
+        rows.append(row)
+        if warm:
+            state = ckpt.state.warm()
+    return pd.DataFrame(rows)
+
+def _ladder_task(name, a_values, x0, solver, make_oracle, warm, kw):
+    table = solve_ladder(a_values, x0, solver, make_oracle, warm, **kw)
+    table.insert(0, "ladder", name)
+    return table
+
+# ladders maps a name to a sequence of a; the ladders run in parallel (make_oracle
+# and kw must be picklable) and come back as one table. A ladder that fails is
+# reported as a single row with status "error".
+def run_ladders(ladders, x0, solver="TR", make_oracle=rosen_oracle, warm=True,
+                max_workers=None, **kw):
+    import pandas as pd
+    workers = min(len(ladders), max_workers or os.cpu_count() or 1)
+    tables = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(_ladder_task, name, list(a_values), x0, solver, make_oracle,
+                               warm, kw): name for name, a_values in ladders.items()}
+        for fut in as_completed(futures):
+            try:
+                table = fut.result()
+                table["status"] = "ok"
+            except Exception as exc:
+                table = pd.DataFrame([{"ladder": futures[fut], "status": "error",
+                                       "error": f"{type(exc).__name__}: {exc}"}])
+            tables[futures[fut]] = table
+    return pd.concat([tables[name] for name in ladders], ignore_index=True)
+
+# One process for a whole sweep instead of one interpreter per value of a:
+#   python continuation.py --a 1 10 100 1000 --solver TR --out ladder.csv
+# runs the values upwards and downwards as two parallel ladders and compares them
+# with cold starts. TR defaults to the exact subproblem (dogleg stalls for small a).
+if __name__ == "__main__":
+    import argparse
+
+    import numpy as np
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--a", type=float, nargs="+", default=list(np.geomspace(1.0, 1e4, 9)))
+    parser.add_argument("--solver", choices=sorted(SOLVERS), default="TR")
+    parser.add_argument("--subproblem", default="exact")
+    parser.add_argument("--x0", type=float, nargs=2, default=(-1.2, 1.0))
+    parser.add_argument("--out")
+    args = parser.parse_args()
+
+    a_up = sorted(args.a)
+    kw = {"subproblem": args.subproblem} if args.solver == "TR" else {}
+    warm = run_ladders({"up": a_up, "down": a_up[::-1]}, tuple(args.x0), args.solver, **kw)
+    cold = solve_ladder(a_up, tuple(args.x0), args.solver, warm=False, **kw)
+    if args.out:
+        warm.to_csv(args.out, index=False)
+    cols = ["ladder", "a", "iters", "nfev", "ngev", "nhev", "gnorm", "time"]
+    print(warm[[c for c in cols if c in warm]].to_string(index=False))
+    print(warm.groupby("ladder", sort=False)[["iters", "nfev", "time"]].sum().to_string())
+    print(f"cold (every a from x0): iters={cold['iters'].sum()} nfev={cold['nfev'].sum()} "
+          f"time={cold['time'].sum():.4f}")
@@ -0,0 +1,274 @@
+# Derivative providers for arbitrary objectives f(x), x of shape (..., n):
+#   "dual"    forward-mode dual numbers (exact gradient and Hessian)
+#   "complex" complex step (f must be analytic, e.g. written with np.sin/np.exp/...)
+#   "central" central differences
+# Every provider evaluates all perturbed points in one batched call of f, so f must
+# accept stacked points along the leading axes (as rosenbrock_linesearch.rosenbrock does).
+import numpy as np
+
+from oracle import CachedOracle
+
+EPS = np.finfo(float).eps
+COMPLEX_H = 1e-20
+
+class Dual:
+    # Value with its gradient (and optionally Hessian) w.r.t. n seed variables:
+    # val has shape S, grad S + (n,), hess S + (n, n) or None (first order only).
+    # NumPy ufuncs (np.sin, np.exp, ...) and operators with arrays dispatch here.
+    def __init__(self, val, grad, hess=None):
+        self.val = val
+        self.grad = grad
+        self.hess = hess
+
+    @property
+    def shape(self):
+        return np.shape(self.val)
+
+    @property
+    def ndim(self):
+        return np.ndim(self.val)
+
+    def __len__(self):
+        return len(self.val)
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def __getitem__(self, idx):
+        idx = idx if isinstance(idx, tuple) else (idx,)
+        hess = None if self.hess is None else self.hess[idx + (slice(None), slice(None))]
+        return Dual(self.val[idx], self.grad[idx + (slice(None),)], hess)
+
+    def sum(self, axis=None, out=None):
+        if axis is None:
+            axes = tuple(range(self.ndim))
+        else:
+            axes = (axis % self.ndim,)
+        hess = None if self.hess is None else self.hess.sum(axis=axes)
+        return Dual(self.val.sum(axis=axes), self.grad.sum(axis=axes), hess)
+
+    # Chain rule for an elementwise function with derivatives d1, d2 at val
+    def _apply(self, val, d1, d2):
+        d1 = np.asarray(d1)
+        grad = d1[..., None] * self.grad
+        hess = None
+        if self.hess is not None:
+            d2 = np.asarray(d2)
+            hess = (d1[..., None, None] * self.hess
+                    + d2[..., None, None] * (self.grad[..., :, None] * self.grad[..., None, :]))
+        return Dual(val, grad, hess)
+
+    def _add(self, other, sign=1.0):
+        if not isinstance(other, Dual):
+            val = self.val + sign*np.asarray(other)
+            n = self.grad.shape[-1]
+            hess = None if self.hess is None else np.broadcast_to(self.hess, np.shape(val) + (n, n))
+            return Dual(val, np.broadcast_to(self.grad, np.shape(val) + (n,)), hess)
+        hess = None
+        if self.hess is not None and other.hess is not None:
+            hess = self.hess + sign*other.hess
+        return Dual(self.val + sign*other.val, self.grad + sign*other.grad, hess)
+
+    def _mul(self, other):
+        if not isinstance(other, Dual):
+            c = np.asarray(other)
+            hess = None if self.hess is None else self.hess * c[..., None, None]
+            return Dual(self.val * c, self.grad * c[..., None], hess)
+        a, b = np.asarray(self.val), np.asarray(other.val)
+        grad = self.grad * b[..., None] + a[..., None] * other.grad
+        hess = None
+        if self.hess is not None and other.hess is not None:
+            cross = self.grad[..., :, None] * other.grad[..., None, :]
+            hess = (self.hess * b[..., None, None] + a[..., None, None] * other.hess
+                    + cross + np.swapaxes(cross, -1, -2))
+        return Dual(a * b, grad, hess)
+
+    def _reciprocal(self):
+        v = np.asarray(self.val)
+        return self._apply(1.0 / v, -1.0 / v**2, 2.0 / v**3)
+
+    def _pow(self, p):
+        if isinstance(p, Dual):
+            return np.exp(p * np.log(self))
+        p = np.asarray(p)
+        v = np.asarray(self.val)
+        return self._apply(v**p, p * v**(p - 1.0), p * (p - 1.0) * v**(p - 2.0))
+
+    __add__ = __radd__ = lambda self, other: self._add(other)
+    __mul__ = __rmul__ = lambda self, other: self._mul(other)
+
+    def __sub__(self, other):
+        return self._add(other, -1.0)
+
+    def __rsub__(self, other):
+        return (-self)._add(other)
+
+    def __neg__(self):
+        return self._mul(-1.0)
+
+    def __pos__(self):
+        return self
+
+    def __truediv__(self, other):
+        if isinstance(other, Dual):
+            return self._mul(other._reciprocal())
+        return self._mul(1.0 / np.asarray(other))
+
+    def __rtruediv__(self, other):
+        return self._reciprocal()._mul(other)
+
+    def __pow__(self, p):
+        return self._pow(p)
+
+    def __rpow__(self, c):
+        return np.exp(self * np.log(c))
+
+    def __abs__(self):
+        v = np.asarray(self.val)
+        return self._apply(np.abs(v), np.sign(v), 0.0)
+
+    # Elementwise functions as (f, f', f'') of the value
+    _UNARY = {
+        np.sin: lambda v: (np.sin(v), np.cos(v), -np.sin(v)),
+        np.cos: lambda v: (np.cos(v), -np.sin(v), -np.cos(v)),
+        np.exp: lambda v: (np.exp(v), np.exp(v), np.exp(v)),
+        np.log: lambda v: (np.log(v), 1.0 / v, -1.0 / v**2),
+        np.sqrt: lambda v: (np.sqrt(v), 0.5 / np.sqrt(v), -0.25 / (v * np.sqrt(v))),
+        np.square: lambda v: (v**2, 2.0 * v, np.full_like(v, 2.0)),
+        np.tanh: lambda v: (np.tanh(v), 1.0 - np.tanh(v)**2,
+                            -2.0 * np.tanh(v) * (1.0 - np.tanh(v)**2)),
+    }
+    _BINARY = {np.add: "__add__", np.subtract: "__sub__", np.multiply: "__mul__",
+               np.true_divide: "__truediv__", np.power: "__pow__"}
+    _RBINARY = {np.add: "__radd__", np.subtract: "__rsub__", np.multiply: "__rmul__",
+                np.true_divide: "__rtruediv__", np.power: "__rpow__"}
+
+    def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
+        if method != "__call__" or kwargs:
+            return NotImplemented
+        if len(inputs) == 1:
+            if ufunc in Dual._UNARY:
+                return self._apply(*Dual._UNARY[ufunc](np.asarray(self.val)))
+            if ufunc is np.negative:
+                return -self
+            if ufunc is np.absolute:
+                return abs(self)
+            return NotImplemented
+        a, b = inputs
+        if ufunc not in Dual._BINARY:
+            return NotImplemented
+        if isinstance(a, Dual):
+            return getattr(a, Dual._BINARY[ufunc])(b)
+        return getattr(b, Dual._RBINARY[ufunc])(a)
+
+# Independent variables x (..., n) as Duals seeded with the identity
+def seed(x, hess=False):
+    x = np.asarray(x, dtype=float)
+    n = x.shape[-1]
+    grad = np.broadcast_to(np.eye(n), x.shape + (n,))
+    H = np.broadcast_to(0.0, x.shape + (n, n)) if hess else None
+    return Dual(x, grad, H)
+
+def _dual_eval(f, x, hess):
+    x = np.asarray(x, dtype=float)
+    out = f(seed(x, hess))
+    if not isinstance(out, Dual):  # f does not depend on x
+        n = x.shape[-1]
+        shape = np.shape(out)
+        return Dual(out, np.zeros(shape + (n,)), np.zeros(shape + (n, n)) if hess else None)
+    return out
+
+def grad_dual(f):
+    return lambda x: np.array(_dual_eval(f, x, False).grad)
+
+def hess_dual(f):
+    return lambda x: np.array(_dual_eval(f, x, True).hess)
+
+def grad_complex(f, h=COMPLEX_H):
+    def grad(x):
+        x = np.asarray(x, dtype=float)
+        Z = x[..., None, :] + 1j*h*np.eye(x.shape[-1])
+        return np.imag(f(Z)) / h
+    return grad
+
+# Central differences of the complex-step gradient: 2n^2 complex points per call
+def hess_complex(f, h=COMPLEX_H):
+    g = grad_complex(f, h)
+    return lambda x: _jacobian_central(g, np.asarray(x, dtype=float))
+
+# Steps d_j = eps^(1/3) max(1, |x_j|), rounded so that x + d is exact
+def _steps(x, power):
+    d = EPS**power * np.maximum(1.0, np.abs(x))
+    return (x + d) - x
+
+def grad_central(f):
+    def grad(x):
+        x = np.asarray(x, dtype=float)
+        n = x.shape[-1]
+        D = _steps(x, 1.0/3.0)[..., None] * np.eye(n)
+        F = f(x[..., None, :] + np.concatenate((D, -D), axis=-2))
+        return (F[..., :n] - F[..., n:]) / (2.0*np.diagonal(D, axis1=-2, axis2=-1))
+    return grad
+
+# Symmetrized Jacobian of a batched gradient from its values at x +- d_j e_j
+def _jacobian_central(grad, x):
+    n = x.shape[-1]
+    D = _steps(x, 1.0/3.0)[..., None] * np.eye(n)
+    G = grad(x[..., None, :] + np.concatenate((D, -D), axis=-2))
+    H = (G[..., :n, :] - G[..., n:, :]) / (2.0*np.diagonal(D, axis1=-2, axis2=-1)[..., :, None])
+    return 0.5*(H + np.swapaxes(H, -1, -2))
+
+# With grad: 2n gradient points; otherwise the four-point formula on f
+# (4n^2 points, dense, meant for small n)
+def hess_central(f, grad=None):
+    if grad is not None:
+        return lambda x: _jacobian_central(grad, np.asarray(x, dtype=float))
+
+    def hess(x):
+        x = np.asarray(x, dtype=float)
+        n = x.shape[-1]
+        d = _steps(x, 0.25)
+        D = d[..., None] * np.eye(n)
+        Di, Dj = D[..., :, None, :], D[..., None, :, :]
+        P = np.stack((Di + Dj, Di - Dj, -Di + Dj, -Di - Dj), axis=-4)
+        F = f(x[..., None, None, None, :] + P)
+        num = F[..., 0, :, :] - F[..., 1, :, :] - F[..., 2, :, :] + F[..., 3, :, :]
+        return num / (4.0 * d[..., :, None] * d[..., None, :])
+    return hess
+
+PROVIDERS = {
+    "dual": lambda f: (grad_dual(f), hess_dual(f)),
+    "complex": lambda f: (grad_complex(f), hess_complex(f)),
+    "central": lambda f: (grad_central(f), hess_central(f)),
+}
+
+# CachedOracle for f with derived derivatives, e.g.
+#   newton_method(x0, oracle=derivative_oracle(ackley))
+#   tr_dogleg(x0, oracle=derivative_oracle(branin, "complex"))
+def derivative_oracle(f, method="dual", maxsize=4):
+    if method not in PROVIDERS:
+        raise ValueError(f"unknown derivative method {method!r}; choose from {sorted(PROVIDERS)}")
+    grad, hess = PROVIDERS[method](f)
+    return CachedOracle(f, grad, hess, maxsize=maxsize)
+
+# Newton and trust region on the notebook test functions with derived derivatives.
+# The TR runs use Steihaug-CG: on Ackley the dogleg path can keep returning the
+# unclipped Cauchy point while the radius shrinks.
+if __name__ == "__main__":
+    from objectives import OBJECTIVES
+    from rosenbrock_linesearch import newton_method
+    from tr_dogleg_rosenbrock import tr_dogleg
+
+    starts = {"ackley": (0.9, 1.1), "branin": (2.5, 3.0), "rastrigin": (1.2, -0.9)}
+    for name, f in OBJECTIVES.items():
+        for method in PROVIDERS:
+            oracle = derivative_oracle(f, method)
+            trace = newton_method(starts[name], oracle=oracle)
+            last = trace.iloc[-1]
+            print(f"{name:9s} {method:7s} NM  iters={len(trace):3d}  "
+                  f"x*=({last['x1']:.6f}, {last['x2']:.6f})  f*={last['f(x)']:.6e}  "
+                  f"{oracle.counters()}")
+            oracle = derivative_oracle(f, method)
+            x, hist = tr_dogleg(starts[name], oracle=oracle, subproblem="steihaug")
+            print(f"{name:9s} {method:7s} TR  iters={len(hist):3d}  "
+                  f"x*=({x[0]:.6f}, {x[1]:.6f})  f*={hist[-1]['f']:.6e}  {oracle.counters()}")
@@ -0,0 +1,165 @@
+# Process-pool experiment runner: solver x starting point x parameter policy
+import math
+import os
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from multiprocessing.sharedctypes import RawArray
+
+import numpy as np
+
+class TaskTimeout(Exception):
+    pass
+
+# Grid entries are (solver name, x0, policy name, policy kwargs).
+# policies maps a solver name to {policy name: kwargs}; other solvers run with {}.
+def make_grid(solvers, starts, policies=None):
+    policies = policies or {}
+    grid = []
+    for name in solvers:
+        for pname, kw in policies.get(name, {"default": {}}).items():
+            for x0 in starts:
+                grid.append((name, tuple(float(v) for v in x0), pname, kw))
+    return grid
+
+# Final iterate of a line-search trace (DataFrame / IterHistory) or a tr_dogleg (x, hist) pair
+def summarize(result):
+    if isinstance(result, tuple):
+        last = result[1][-1]
+        return {"iters": int(last['k']) + 1, "x*": tuple(np.asarray(result[0]).tolist()),
+                "f*": float(last['f']), "gnorm": float(last['gnorm'])}
+    last = result.iloc[-1] if hasattr(result, "iloc") else result[-1]
+    return {"iters": len(result), "x*": (float(last["x1"]), float(last["x2"])),
+            "f*": float(last["f(x)"]), "gnorm": float(last["||grad||"])}
+
+def _raise_timeout(signum, frame):
+    raise TaskTimeout()
+
+# Per-task wall-clock limit via SIGALRM (workers run tasks on their main thread)
+@contextmanager
+def _deadline(seconds):
+    if not seconds or not hasattr(signal, "setitimer"):
+        yield
+        return
+    old = signal.signal(signal.SIGALRM, _raise_timeout)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, old)
+
+def _task_row(i, task):
+    name, x0, pname, _ = task
+    return {"task": i, "solver": name, "x0": x0, "policy": pname}
+
+# started[i] is set by the worker when task i begins, so after a worker dies the
+# parent can tell which task was running
+_started = None
+
+def _init_worker(started):
+    global _started
+    _started = started
+
+def _run_chunk(solvers, chunk, timeout):
+    rows = []
+    for i, task in chunk:
+        if _started is not None:
+            _started[i] = 1
+        name, x0, _, kw = task
+        row = _task_row(i, task)
+        t0 = time.perf_counter()
+        try:
+            with _deadline(timeout):
+                row.update(summarize(solvers[name](x0, **kw)))
+            row["status"] = "ok"
+            if kw.get("stop") is not None:
+                # stopping.StopCriteria in the policy: which criterion ended the run
+                row["stop"] = kw["stop"].reason
+        except TaskTimeout:
+            row["status"] = "timeout"
+        except Exception as exc:
+            row["status"] = "error"
+            row["error"] = f"{type(exc).__name__}: {exc}"
+        row["time"] = time.perf_counter() - t0
+        rows.append(row)
+    return rows
+
+def _crashed_row(i, task, exc):
+    row = _task_row(i, task)
+    row["status"] = "crashed"
+    row["error"] = f"{type(exc).__name__}: {exc}"
+    return row
+
+# Runs chunks in a fresh pool until they are done or a worker dies. Returns the chunks
+# to submit again and the tasks that were running when the pool broke: the last task
+# begun in each unfinished chunk (the one that killed its worker, or was stopped with it).
+def _run_pool(solvers, chunks, workers, timeout, started, rows):
+    retry, running, broken = [], [], None
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(started,)) as pool:
+        futures = {pool.submit(_run_chunk, solvers, chunk, timeout): chunk for chunk in chunks}
+        for fut in as_completed(futures):
+            chunk = futures[fut]
+            try:
+                rows.extend(fut.result())
+            except BrokenProcessPool as exc:
+                broken = exc
+                begun = [j for j, (i, _) in enumerate(chunk) if started[i]]
+                if begun:
+                    running.append(chunk[begun[-1]])
+                    chunk = chunk[:begun[-1]] + chunk[begun[-1] + 1:]
+                for i, _ in chunk:
+                    started[i] = 0
+                if chunk:
+                    retry.append(chunk)
+            except Exception as exc:
+                rows.extend(_crashed_row(i, task, exc) for i, task in chunk)
+    for i, _ in running:
+        started[i] = 0
+    if broken is not None and not running:
+        # The pool broke before any task began: nothing to isolate, give up on the rest
+        rows.extend(_crashed_row(i, task, broken) for chunk in retry for i, task in chunk)
+        retry = []
+    return retry, running, broken
+
+# Solvers must be picklable (module-level functions). Tasks are shipped in chunks.
+# When a worker dies (os._exit, segfault, OOM kill) the pool is rebuilt and only the
+# unfinished chunks are submitted again; the tasks that were running at the time are
+# re-run one by one on a single worker, and only a task that kills the worker there
+# is recorded as "crashed".
+def run_grid(solvers, grid, max_workers=None, chunksize=None, timeout=None):
+    import pandas as pd
+    tasks = list(enumerate(grid))
+    workers = max_workers or os.cpu_count() or 1
+    if chunksize is None:
+        chunksize = max(1, math.ceil(len(tasks) / (4*workers)))
+    chunks = [tasks[i:i+chunksize] for i in range(0, len(tasks), chunksize)]
+    started = RawArray("b", len(tasks))
+    rows = []
+    while chunks:
+        chunks, suspects, _ = _run_pool(solvers, chunks, workers, timeout, started, rows)
+        while suspects:
+            retry, culprits, exc = _run_pool(solvers, [[task] for task in suspects], 1,
+                                             timeout, started, rows)
+            rows.extend(_crashed_row(i, task, exc) for i, task in culprits)
+            suspects = [chunk[0] for chunk in retry]
+    return pd.DataFrame(rows).sort_values("task").set_index("task")
+
+if __name__ == "__main__":
+    from rosenbrock_linesearch import newton_method, steepest_descent
+    from stopping import StopCriteria
+    from tr_dogleg_rosenbrock import POLICY_A, POLICY_B, tr_dogleg
+
+    solvers = {"SD": steepest_descent, "NM": newton_method, "TR": tr_dogleg}
+    starts = [(x1, x2) for x1 in np.linspace(-2.0, 2.0, 5) for x2 in np.linspace(-1.0, 3.0, 5)]
+    # SD also runs with early stopping once f stagnates (checked every 10 iterations)
+    grid = make_grid(solvers, starts, {
+        "SD": {"full": {}, "early": {"stop": StopCriteria(ftol=1e-5, every=10)}},
+        "TR": {"A": POLICY_A, "B": POLICY_B}})
+    table = run_grid(solvers, grid, timeout=60.0)
+    table.to_csv("sweep_results.csv")
+    print(table.groupby(["solver", "policy"])[["iters", "time"]].mean())
+    print(table["status"].value_counts().to_string())
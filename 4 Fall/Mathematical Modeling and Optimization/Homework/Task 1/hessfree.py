@@ -0,0 +1,95 @@
+# Matrix-free Newton: Hessian-vector products, truncated CG and Steihaug-CG
+import math
+
+import numpy as np
+
+class HessVecOperator:
+    # Hessian at x seen only through B @ v. hessvec(x, v) is user supplied;
+    # without it B @ v = (grad(x + h v) - grad(x)) / h (one gradient per product).
+    def __init__(self, grad, x, g, hessvec=None):
+        self.grad = grad
+        self.x = x
+        self.g = g
+        self.hessvec = hessvec
+        self.shape = (x.size, x.size)
+        self.nprod = 0
+
+    def __matmul__(self, v):
+        self.nprod += 1
+        if self.hessvec is not None:
+            return self.hessvec(self.x, v)
+        vn = np.linalg.norm(v)
+        if vn == 0.0:
+            return np.zeros_like(v)
+        h = math.sqrt(np.finfo(float).eps) * (1.0 + np.linalg.norm(self.x)) / vn
+        return (self.grad(self.x + h*v) - self.g) / h
+
+# hessvec argument of the solvers: "fd" -> finite differences of grad, callable -> user hvp.
+# The probes x + h v use oracle.grad_trial: counted in ngev, but they do not evict x
+# from the cache (a rejected trust-region step reuses f, g at x).
+def hessvec_operator(oracle, x, g, hessvec):
+    return HessVecOperator(oracle.grad_trial, x, g, None if hessvec == "fd" else hessvec)
+
+def _forcing_tol(g):
+    gn = np.linalg.norm(g)
+    return min(0.5, math.sqrt(gn)) * gn
+
+# Truncated CG on B p = -g for line-search Newton-CG. Stops on negative
+# curvature (returning -g if that happens on the first sweep) or when the
+# residual drops below the forcing tolerance.
+def newton_cg_direction(g, B, tol=None, maxiter=None):
+    tol = _forcing_tol(g) if tol is None else tol
+    maxiter = 2*g.size if maxiter is None else maxiter
+    z = np.zeros_like(g)
+    r = g.copy()
+    d = -r
+    rr = r @ r
+    for j in range(maxiter):
+        Bd = B @ d
+        dBd = d @ Bd
+        if dBd <= 0:
+            return -g if j == 0 else z
+        alpha = rr / dBd
+        z = z + alpha*d
+        r = r + alpha*Bd
+        rr_new = r @ r
+        if math.sqrt(rr_new) < tol:
+            break
+        d = -r + (rr_new / rr)*d
+        rr = rr_new
+    return z
+
+def _to_boundary(z, d, Delta):
+    # tau >= 0 with ||z + tau d|| = Delta
+    a = d @ d
+    b = 2.0*(z @ d)
+    c = z @ z - Delta**2
+    return z + ((-b + math.sqrt(max(0.0, b*b - 4.0*a*c))) / (2.0*a))*d
+
+# Steihaug-CG for min g.p + 0.5 p.B.p s.t. ||p|| <= Delta (needs only B @ v)
+def steihaug_cg(g, B, Delta, tol=None, maxiter=None):
+    tol = _forcing_tol(g) if tol is None else tol
+    maxiter = 2*g.size if maxiter is None else maxiter
+    z = np.zeros_like(g)
+    r = g.copy()
+    if np.linalg.norm(r) < tol:
+        return z
+    d = -r
+    rr = r @ r
+    for _ in range(maxiter):
+        Bd = B @ d
+        dBd = d @ Bd
+        if dBd <= 0:
+            return _to_boundary(z, d, Delta)
+        alpha = rr / dBd
+        z_new = z + alpha*d
+        if np.linalg.norm(z_new) >= Delta:
+            return _to_boundary(z, d, Delta)
+        z = z_new
+        r = r + alpha*Bd
+        rr_new = r @ r
+        if math.sqrt(rr_new) < tol:
+            return z
+        d = -r + (rr_new / rr)*d
+        rr = rr_new
+    return z
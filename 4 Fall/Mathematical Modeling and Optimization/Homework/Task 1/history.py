@@ -0,0 +1,117 @@
+# Array-backed iteration history for the optimization scripts
+import numpy as np
+
+class IterHistory:
+    # Rows live in a preallocated structured array that doubles when full.
+    # every=k keeps every k-th row, last=N keeps only the newest N rows (ring buffer);
+    # the most recent row is always kept so the final iterate is never lost.
+    def __init__(self, dtype, capacity=256, every=1, last=None):
+        self.dtype = np.dtype(dtype)
+        self.every = int(every)
+        self.last = last
+        self._buf = np.empty(last if last else capacity, dtype=self.dtype)
+        self._n = 0
+        self._head = 0
+        self._seen = 0
+        self._final = None
+        self._view = None
+
+    def append(self, row):
+        self._view = None
+        i = self._seen
+        self._seen += 1
+        if i % self.every:
+            self._final = row
+            return
+        self._final = None
+        if self.last:
+            if self._n < self.last:
+                self._buf[self._n] = row
+                self._n += 1
+            else:
+                self._buf[self._head] = row
+                self._head = (self._head + 1) % self.last
+            return
+        if self._n == len(self._buf):
+            buf = np.empty(2*len(self._buf), dtype=self.dtype)
+            buf[:self._n] = self._buf
+            self._buf = buf
+        self._buf[self._n] = row
+        self._n += 1
+
+    # Bulk append of a structured array of rows (e.g. from a compiled kernel)
+    def extend(self, rows):
+        self._view = None
+        if self.every == 1 and not self.last and self._final is None:
+            need = self._n + len(rows)
+            if need > len(self._buf):
+                buf = np.empty(max(need, 2*len(self._buf)), dtype=self.dtype)
+                buf[:self._n] = self._buf[:self._n]
+                self._buf = buf
+            self._buf[self._n:need] = rows
+            self._n = need
+            self._seen += len(rows)
+            return
+        for row in rows:
+            self.append(row)
+
+    @property
+    def seen(self):
+        return self._seen
+
+    # Cached until the next append / extend
+    @property
+    def array(self):
+        if self._view is None:
+            self._view = self._trimmed()
+        return self._view
+
+    def _trimmed(self):
+        if self._head:
+            out = np.concatenate((self._buf[self._head:self._n], self._buf[:self._head]))
+        else:
+            out = self._buf[:self._n]
+        if self._final is not None:
+            out = np.concatenate((out, np.array([self._final], dtype=self.dtype)))
+            if self.last and len(out) > self.last:
+                out = out[1:]
+        return out
+
+    def __len__(self):
+        if self._final is None or (self.last and self._n == self.last):
+            return self._n
+        return self._n + 1
+
+    # Integer rows are read straight from the buffer (O(1), e.g. hist[-1] in a loop);
+    # slices and field names go through the cached array
+    def __getitem__(self, i):
+        if not isinstance(i, (int, np.integer)):
+            return self.array[i]
+        n = len(self)
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError(f"row {i} out of range for {n} rows")
+        if self._final is not None:
+            if i == n - 1:
+                return np.array([self._final], dtype=self.dtype)[0]
+            if self.last and self._n == self.last:
+                i += 1  # the oldest buffered row is dropped for the final one
+        return self._buf[(self._head + i) % self._n if self._head else i]
+
+    def __iter__(self):
+        return iter(self.array)
+
+    # pandas is only imported here; vector fields (e.g. x) become x1, x2, ...
+    def to_frame(self):
+        import pandas as pd
+        arr = self.array
+        cols = {}
+        for name in self.dtype.names:
+            col = arr[name]
+            if col.ndim > 1:
+                for j in range(col.shape[1]):
+                    cols[f"{name}{j+1}"] = col[:, j]
+            else:
+                cols[name] = col
+        return pd.DataFrame(cols)
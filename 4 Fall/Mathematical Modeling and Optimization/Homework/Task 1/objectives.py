@@ -0,0 +1,30 @@
+# Test functions from the Powell / Task 2 notebooks in batch form: x has shape (..., n).
+# Written with NumPy ufuncs only, so derivatives.py can differentiate them
+# (dual numbers, complex step) and evaluate many points per call.
+import numpy as np
+
+def ackley(x):
+    n = x.shape[-1]
+    r2 = np.sum(x**2, axis=-1) / n
+    c = np.sum(np.cos(2.0*np.pi*x), axis=-1) / n
+    return -20.0*np.exp(-0.2*np.sqrt(r2)) - np.exp(c) + np.e + 20.0
+
+def branin(x):
+    x1, x2 = x[..., 0], x[..., 1]
+    b = 5.1 / (4.0*np.pi**2)
+    c = 5.0 / np.pi
+    r, s, t = 6.0, 10.0, 1.0 / (8.0*np.pi)
+    return (x2 - b*x1**2 + c*x1 - r)**2 + s*(1.0 - t)*np.cos(x1) + s
+
+def rastrigin(x):
+    n = x.shape[-1]
+    return 10.0*n + np.sum(x**2 - 10.0*np.cos(2.0*np.pi*x), axis=-1)
+
+OBJECTIVES = {"ackley": ackley, "branin": branin, "rastrigin": rastrigin}
+
+# Global minima (Branin has three, all with f = 0.397887...)
+KNOWN_MINIMA = {
+    "ackley": [(0.0, 0.0)],
+    "branin": [(-np.pi, 12.275), (np.pi, 2.275), (9.42478, 2.475)],
+    "rastrigin": [(0.0, 0.0)],
+}
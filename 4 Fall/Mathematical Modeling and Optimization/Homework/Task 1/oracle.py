@@ -0,0 +1,115 @@
+# Memoized f/grad/Hessian oracle shared by the line-search and trust-region solvers
+from collections import OrderedDict
+
+import numpy as np
+
+class CachedOracle:
+    # Keeps f, g, H for the last `maxsize` points (LRU eviction).
+    # Cached arrays are returned read-only; batched inputs (ndim > 1) bypass the cache.
+    # Throwaway points (line-search trials, finite-difference probes) go through
+    # f_trial / grad_trial: counted like any evaluation but kept out of the LRU, so
+    # they cannot evict the iterate. The latest trial of each kind is remembered and
+    # moves into the cache if that point is evaluated again (the accepted step). The
+    # trial array is kept without a copy, so it must not be modified afterwards.
+    def __init__(self, f, grad, hess=None, maxsize=4):
+        self._f = f
+        self._grad = grad
+        self._hess = hess
+        self.maxsize = maxsize
+        self._cache = OrderedDict()
+        self._trial = [None, None]
+        self.hits = 0
+        self.misses = 0
+        self.nfev = 0
+        self.ngev = 0
+        self.nhev = 0
+
+    def _entry(self, x):
+        key = x.tobytes()
+        entry = self._cache.get(key)
+        if entry is None:
+            entry = [None, None, None]
+            for slot, trial in enumerate(self._trial):
+                if trial is not None and trial[0].tobytes() == key:
+                    entry[slot] = trial[1]
+            self._cache[key] = entry
+            if len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(key)
+        return entry
+
+    def _fill(self, entry, x, slot):
+        if entry[slot] is not None:
+            self.hits += 1
+            return entry[slot]
+        self.misses += 1
+        if slot == 0:
+            self.nfev += 1
+            entry[0] = self._f(x)
+        elif slot == 1:
+            self.ngev += 1
+            entry[1] = np.asarray(self._grad(x))
+            entry[1].flags.writeable = False
+        else:
+            # Hessians may also be structured operators (e.g. rosenbrock_nd.TridiagHessian)
+            self.nhev += 1
+            entry[2] = self._hess(x)
+            if isinstance(entry[2], np.ndarray):
+                entry[2].flags.writeable = False
+        return entry[slot]
+
+    def _lookup(self, x, slot):
+        return self._fill(self._entry(x), x, slot)
+
+    def f(self, x):
+        if x.ndim > 1:
+            self.nfev += x.size // x.shape[-1]
+            return self._f(x)
+        return self._lookup(x, 0)
+
+    def grad(self, x):
+        if x.ndim > 1:
+            self.ngev += x.size // x.shape[-1]
+            return self._grad(x)
+        return self._lookup(x, 1)
+
+    def hess(self, x):
+        if x.ndim > 1:
+            self.nhev += x.size // x.shape[-1]
+            return self._hess(x)
+        return self._lookup(x, 2)
+
+    def f_trial(self, x):
+        if x.ndim > 1:
+            return self.f(x)
+        self.misses += 1
+        self.nfev += 1
+        val = self._f(x)
+        self._trial[0] = (x, val)
+        return val
+
+    def grad_trial(self, x):
+        if x.ndim > 1:
+            return self.grad(x)
+        self.misses += 1
+        self.ngev += 1
+        val = np.asarray(self._grad(x))
+        val.flags.writeable = False
+        self._trial[1] = (x, val)
+        return val
+
+    # Fused evaluation at one point: (f, g) or (f, g, H)
+    def evaluate(self, x, hess=False):
+        entry = self._entry(x)
+        if hess:
+            return self._fill(entry, x, 0), self._fill(entry, x, 1), self._fill(entry, x, 2)
+        return self._fill(entry, x, 0), self._fill(entry, x, 1)
+
+    def counters(self):
+        return {"hits": self.hits, "misses": self.misses,
+                "nfev": self.nfev, "ngev": self.ngev, "nhev": self.nhev}
+
+    def clear(self):
+        self._cache.clear()
+        self._trial = [None, None]
@@ -0,0 +1,94 @@
+# Per-phase wall-clock accounting for the solver loops.
+#   timer = PhaseTimer()
+#   with timer:                      # optional: also measures the total wall time
+#       trace = newton_method(x0, timer=timer)
+#   print(timer.to_frame())          # phase, calls, total, mean, share
+# Solvers wrap their phases in `with phase("oracle"): ...` where phase = phases(timer);
+# with timer=None that is a shared no-op context, so disabled profiling costs one
+# call and an empty with-block per phase.
+import time
+from contextlib import nullcontext
+
+_NULL = nullcontext()
+
+def _no_phase(name):
+    return _NULL
+
+class _Phase:
+    # Reused for every entry of the same phase (a phase must not nest inside itself).
+    # Times are exclusive: entering a nested phase pauses the enclosing one, so
+    # e.g. the Hessian evaluation inside Newton's linear_solve counts as oracle only.
+    __slots__ = ("timer", "name", "t0")
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+        self.t0 = 0.0
+
+    def _add(self, now):
+        timer = self.timer
+        timer.totals[self.name] = timer.totals.get(self.name, 0.0) + (now - self.t0)
+
+    def __enter__(self):
+        now = self.timer.clock()
+        stack = self.timer._stack
+        if stack:
+            stack[-1]._add(now)
+        stack.append(self)
+        self.t0 = now
+
+    def __exit__(self, *exc):
+        now = self.timer.clock()
+        self._add(now)
+        self.timer.counts[self.name] = self.timer.counts.get(self.name, 0) + 1
+        stack = self.timer._stack
+        stack.pop()
+        if stack:
+            stack[-1].t0 = now
+
+class PhaseTimer:
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.totals = {}
+        self.counts = {}
+        self.wall = None
+        self._phases = {}
+        self._stack = []
+        self._t0 = None
+
+    def phase(self, name):
+        ph = self._phases.get(name)
+        if ph is None:
+            ph = self._phases[name] = _Phase(self, name)
+        return ph
+
+    def __enter__(self):
+        self._t0 = self.clock()
+        return self
+
+    def __exit__(self, *exc):
+        self.wall = (self.wall or 0.0) + self.clock() - self._t0
+
+    def reset(self):
+        self.totals.clear()
+        self.counts.clear()
+        self.wall = None
+
+    # {phase: {"calls", "total", "mean"}}; "other" is wall time outside every phase
+    def report(self):
+        out = {name: {"calls": self.counts[name], "total": total, "mean": total / self.counts[name]}
+               for name, total in self.totals.items()}
+        if self.wall is not None:
+            out["other"] = {"calls": 1, "total": max(0.0, self.wall - sum(self.totals.values())),
+                            "mean": None}
+        return out
+
+    def to_frame(self):
+        import pandas as pd
+        df = pd.DataFrame.from_dict(self.report(), orient="index")
+        df.index.name = "phase"
+        df["share"] = df["total"] / df["total"].sum()
+        return df.sort_values("total", ascending=False)
+
+def phases(timer):
+    return _no_phase if timer is None else timer.phase
@@ -0,0 +1,288 @@
+# Optional numba backend: Rosenbrock oracles and the SD / Newton / dogleg loops
+# compiled to native code. Without numba the *_jit solvers run the pure-NumPy ones.
+# The kernels repeat the NumPy arithmetic operation by operation, so traces match.
+import ctypes
+import ctypes.util
+import math
+import time
+
+import numpy as np
+
+import rosenbrock_linesearch as ls
+import tr_dogleg_rosenbrock as tr
+from history import IterHistory
+
+try:
+    from numba import njit
+    HAVE_NUMBA = True
+except ImportError:
+    HAVE_NUMBA = False
+
+    def njit(*args, **kwargs):
+        if args and callable(args[0]):
+            return args[0]
+        return lambda fn: fn
+
+# x**2 on Python / NumPy floats calls the C library pow(), which is not always
+# bit-equal to x*x; LLVM folds a literal x**2 into x*x, so the kernels call pow()
+# through ctypes instead. Without a locatable libm the last bit may differ.
+_libm_path = ctypes.util.find_library("m")
+if _libm_path:
+    _pow = ctypes.CDLL(_libm_path).pow
+    _pow.restype = ctypes.c_double
+    _pow.argtypes = [ctypes.c_double, ctypes.c_double]
+
+    @njit
+    def _sq(u):
+        return _pow(u, 2.0)
+else:
+    @njit
+    def _sq(u):
+        return u*u
+
+# CPython's math.hypot (3.10+) is not libm hypot but a compensated sum of
+# lossless squares; this is that algorithm for two arguments (Dekker products)
+@njit
+def _split(x):
+    t = x * 134217729.0
+    hi = t - (t - x)
+    return hi, x - hi
+
+@njit
+def _dl_mul(x, y):
+    xh, xl = _split(x)
+    yh, yl = _split(y)
+    p = xh * yh
+    q = xh * yl + xl * yh
+    z = p + q
+    return z, p - z + q + xl * yl
+
+@njit
+def _hypot(u, v):
+    u, v = abs(u), abs(v)
+    big = max(u, v)
+    if math.isinf(big) or math.isnan(u) or math.isnan(v) or big == 0.0:
+        return math.hypot(u, v)
+    max_e = math.frexp(big)[1]
+    if max_e < -1023:
+        return math.hypot(u, v)
+    scale = math.ldexp(1.0, -max_e)
+    csum, frac1, frac2 = 1.0, 0.0, 0.0
+    for x in (u * scale, v * scale):
+        hi, lo = _dl_mul(x, x)
+        s = csum + hi
+        frac1 += lo
+        frac2 += hi - (s - csum)
+        csum = s
+    h = math.sqrt(csum - 1.0 + (frac1 + frac2))
+    hi, lo = _dl_mul(-h, h)
+    s = csum + hi
+    frac1 += lo
+    frac2 += hi - (s - csum)
+    csum = s
+    h += (csum - 1.0 + (frac1 + frac2)) / (2.0 * h)
+    return h / scale
+
+# np.linalg.norm of a real vector is sqrt(x.dot(x)); numba's norm goes through
+# nrm2 and can differ in the last bit, so the kernels use this instead
+@njit
+def _norm(v):
+    return np.sqrt(v @ v)
+
+@njit
+def _f(x, a):
+    x1, x2 = x[0], x[1]
+    return a*_sq(x2 - _sq(x1)) + _sq(1.0 - x1)
+
+@njit
+def _grad(x, a):
+    x1, x2 = x[0], x[1]
+    g = np.empty(2)
+    g[0] = -4.0*a*x1*(x2 - _sq(x1)) - 2.0*(1.0 - x1)
+    g[1] = 2.0*a*(x2 - _sq(x1))
+    return g
+
+# The two scripts write H11 in algebraically equal forms that round differently;
+# each kernel keeps the form of the script it mirrors.
+@njit
+def _hess(x, a, tr_form):
+    x1, x2 = x[0], x[1]
+    H = np.empty((2, 2))
+    if tr_form:
+        H[0, 0] = -4.0*a*(x2 - _sq(x1)) + 8.0*a*_sq(x1) + 2.0
+    else:
+        H[0, 0] = 12.0*a*_sq(x1) - 4.0*a*x2 + 2.0
+    H[0, 1] = -4.0*a*x1
+    H[1, 0] = H[0, 1]
+    H[1, 1] = 2.0*a
+    return H
+
+@njit
+def _backtracking(x, p, fk, gk, a, alpha_bar, rho, c, max_backtracks):
+    alpha = alpha_bar
+    slope0 = np.dot(gk, p)
+    if slope0 >= 0:
+        p = -p
+        slope0 = np.dot(gk, p)
+    bt = 0
+    while _f(x + alpha*p, a) > fk + c*alpha*slope0 and bt < max_backtracks:
+        alpha *= rho
+        bt += 1
+    return alpha, p, bt
+
+# Same loop as rosenbrock_linesearch._descent_loop; rows are RECORD_DTYPE fields
+@njit
+def _descent_kernel(x0, newton, max_iter, tol, alpha_bar, rho, c, max_backtracks):
+    a = 100.0
+    out = np.empty((max_iter, 7))
+    x = x0.copy()
+    n = 0
+    for k in range(max_iter):
+        g = _grad(x, a)
+        gn = _norm(g)
+        fval = _f(x, a)
+        if gn <= tol:
+            out[n] = np.array([k, x[0], x[1], fval, gn, np.nan, 0.0])
+            n += 1
+            break
+        if newton:
+            pk = -np.linalg.solve(_hess(x, a, False), g)
+        else:
+            pk = -g
+        alpha, pk, bt = _backtracking(x, pk, fval, g, a, alpha_bar, rho, c, max_backtracks)
+        x = x + alpha*pk
+        out[n] = np.array([k, x[0], x[1], _f(x, a), _norm(_grad(x, a)), alpha, bt])
+        n += 1
+    return out[:n]
+
+@njit
+def _dogleg_step(g, B, Delta, eps_pd):
+    b11, b12, b22 = B[0, 0], B[0, 1], B[1, 1]
+    lam = 0.5*(b11 + b22) - _hypot(0.5*(b11 - b22), b12)
+    if lam <= eps_pd:
+        shift = eps_pd - lam + 1e-8
+        B = B + shift*np.eye(2)
+        b11, b22 = b11 + shift, b22 + shift
+    det = b11*b22 - b12*b12
+    pB = -np.array([(b22*g[0] - b12*g[1]) / det, (b11*g[1] - b12*g[0]) / det])
+
+    gBg = g @ (B @ g)
+    if gBg <= 0:
+        pU = -Delta * g / (_norm(g) + 1e-16)
+    else:
+        pU = -((g @ g) / gBg) * g
+
+    if _norm(pB) <= Delta:
+        return pB
+
+    d = pB - pU
+    qa = d @ d
+    qb = 2.0 * (pU @ d)
+    qc = pU @ pU - _sq(Delta)
+    disc = max(0.0, qb*qb - 4.0*qa*qc)
+    t1 = (-qb + np.sqrt(disc)) / (2.0*qa) if qa > 0 else 0.0
+    t2 = (-qb - np.sqrt(disc)) / (2.0*qa) if qa > 0 else 0.0
+    if 0.0 <= t1 <= 1.0:
+        t = t1
+    elif 0.0 <= t2 <= 1.0:
+        t = t2
+    else:
+        t = min(max(t1, 0.0), 1.0)
+    return pU + t * d
+
+# Same loop as tr_dogleg; rows are (k, x1, x2, f, gnorm, Delta)
+@njit
+def _tr_kernel(x0, a, Delta0, Deltamax, rho_lo, rho_hi, eta, shrink, grow, gtol, maxit):
+    out = np.empty((maxit, 6))
+    x = x0.copy()
+    Delta = Delta0
+    n = 0
+    for k in range(maxit):
+        f = _f(x, a)
+        g = _grad(x, a)
+        B = _hess(x, a, True)
+        gnorm = _norm(g)
+        out[n] = np.array([k, x[0], x[1], f, gnorm, Delta])
+        n += 1
+        if gnorm < gtol:
+            break
+        p = _dogleg_step(g, B, Delta, 1e-12)
+        pred = f - (f + g @ p + 0.5 * p @ (B @ p))
+        ared = f - _f(x + p, a)
+        rho = ared / (pred + 1e-16)
+        if rho < rho_lo:
+            Delta *= shrink
+        elif (rho > rho_hi) and (_norm(p) >= Delta - 1e-14):
+            Delta = min(grow * Delta, Deltamax)
+        if rho > eta:
+            x = x + p
+    return x, out[:n]
+
+def _frame(out):
+    rec = np.empty(len(out), dtype=ls.RECORD_DTYPE)
+    for j, name in enumerate(ls.RECORD_COLUMNS):
+        rec[name] = out[:, j]
+    hist = IterHistory(ls.RECORD_DTYPE, capacity=max(1, len(rec)))
+    hist.extend(rec)
+    return hist.to_frame()
+
+def steepest_descent_jit(x0, max_iter=ls.MAX_SD_IT, tol=ls.TOL):
+    if not HAVE_NUMBA:
+        return ls.steepest_descent(x0, max_iter, tol)
+    return _frame(_descent_kernel(np.array(x0, dtype=float), False, max_iter, tol,
+                                  ls.ALPHA_BAR, ls.RHO, ls.C_ARMIJO, ls.MAX_BT))
+
+# A singular Hessian (lstsq fallback in the pure solver) reruns the pure version
+def newton_method_jit(x0, max_iter=ls.MAX_NT_IT, tol=ls.TOL):
+    if not HAVE_NUMBA:
+        return ls.newton_method(x0, max_iter, tol)
+    try:
+        out = _descent_kernel(np.array(x0, dtype=float), True, max_iter, tol,
+                              ls.ALPHA_BAR, ls.RHO, ls.C_ARMIJO, ls.MAX_BT)
+    except np.linalg.LinAlgError:
+        return ls.newton_method(x0, max_iter, tol)
+    return _frame(out)
+
+def tr_dogleg_jit(x0, a=100.0, Delta0=1.0, Deltamax=100.0,
+                  rho_lo=0.25, rho_hi=0.75, eta=0.0,
+                  shrink=0.25, grow=2.0, gtol=1e-8, maxit=200):
+    if not HAVE_NUMBA:
+        return tr.tr_dogleg(x0, a, Delta0, Deltamax, rho_lo, rho_hi, eta, shrink, grow, gtol, maxit)
+    x, out = _tr_kernel(np.array(x0, dtype=float).reshape(2), float(a), float(Delta0),
+                        float(Deltamax), rho_lo, rho_hi, eta, shrink, grow, gtol, maxit)
+    rec = np.empty(len(out), dtype=tr.tr_history_dtype(2))
+    rec['k'] = out[:, 0]
+    rec['x1'], rec['x2'] = out[:, 1], out[:, 2]
+    rec['f'], rec['gnorm'], rec['Delta'] = out[:, 3], out[:, 4], out[:, 5]
+    hist = IterHistory(tr.tr_history_dtype(2), capacity=max(1, len(rec)))
+    hist.extend(rec)
+    return x, hist
+
+def _best_time(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+# Benchmark: pure NumPy vs compiled, same start points, traces compared exactly
+if __name__ == "__main__":
+    print("numba available:", HAVE_NUMBA)
+    cases = [
+        ("SD (-1.2, 1.0)", lambda: ls.steepest_descent((-1.2, 1.0)),
+         lambda: steepest_descent_jit((-1.2, 1.0))),
+        ("NM (-1.2, 1.0)", lambda: ls.newton_method((-1.2, 1.0)),
+         lambda: newton_method_jit((-1.2, 1.0))),
+        ("TR Policy A", lambda: tr.tr_dogleg([-1.2, 1.0], **tr.POLICY_A)[1].to_frame(),
+         lambda: tr_dogleg_jit([-1.2, 1.0], **tr.POLICY_A)[1].to_frame()),
+        ("TR Policy B", lambda: tr.tr_dogleg([-1.2, 1.0], **tr.POLICY_B)[1].to_frame(),
+         lambda: tr_dogleg_jit([-1.2, 1.0], **tr.POLICY_B)[1].to_frame()),
+    ]
+    for name, pure, jit in cases:
+        jit()  # compile outside the timing
+        same = pure().equals(jit())
+        t_pure = _best_time(pure, 5)
+        t_jit = _best_time(jit, 5)
+        print(f"{name:16s} pure={t_pure*1e3:8.2f} ms  jit={t_jit*1e3:8.2f} ms  "
+              f"speedup={t_pure/t_jit:6.1f}x  identical={same}")
@@ -1,91 +1,567 @@
 
-# Rosenbrock minimization with Armijo backtracking (SD & Newton)
+# Rosenbrock minimization with Armijo backtracking (SD, Newton, BFGS & L-BFGS)
 import numpy as np
-import pandas as pd
+
+from checkpoint import SolverState, starting_point
+from hessfree import hessvec_operator, newton_cg_direction
+from history import IterHistory
+from oracle import CachedOracle
+from profiling import phases
 
 ALPHA_BAR = 1.0
 RHO       = 0.5
 C_ARMIJO  = 1e-4
+C_WOLFE   = 0.9
 TOL       = 1e-8
 MAX_SD_IT = 2000
 MAX_NT_IT = 200
+MAX_QN_IT = 500
+MAX_BT    = 60
+ALPHA_MIN = 1e-10
+
+LINE_SEARCHES = ("backtracking", "ladder", "interp", "wolfe")
+
+RECORD_DTYPE = [("iter", np.int64), ("x1", float), ("x2", float), ("f(x)", float),
+                ("||grad||", float), ("alpha", float), ("backtracks", np.int64)]
+RECORD_COLUMNS = [name for name, _ in RECORD_DTYPE]
+
+# Oracles accept a single point (2,) or a batch of points (..., 2)
+def _coords(x):
+    if x.ndim == 1:
+        return x[0], x[1]
+    return x[..., 0], x[..., 1]
 
 def rosenbrock(x):
-    x1, x2 = x[0], x[1]
+    x1, x2 = _coords(x)
     return 100.0*(x2 - x1**2)**2 + (1.0 - x1)**2
 
 def grad_rosenbrock(x):
-    x1, x2 = x[0], x[1]
+    x1, x2 = _coords(x)
     df_dx1 = -400.0*x1*(x2 - x1**2) - 2.0*(1.0 - x1)
     df_dx2 = 200.0*(x2 - x1**2)
-    return np.array([df_dx1, df_dx2])
+    if x.ndim == 1:
+        return np.array([df_dx1, df_dx2])
+    return np.stack([df_dx1, df_dx2], axis=-1)
 
 def hess_rosenbrock(x):
-    x1, x2 = x[0], x[1]
+    x1, x2 = _coords(x)
     h11 = 1200.0*x1**2 - 400.0*x2 + 2.0
     h12 = -400.0*x1
-    h22 = 200.0
-    return np.array([[h11, h12],[h12, h22]])
+    if x.ndim == 1:
+        return np.array([[h11, h12],[h12, 200.0]])
+    h22 = np.full_like(h11, 200.0)
+    return np.stack([np.stack([h11, h12], axis=-1),
+                     np.stack([h12, h22], axis=-1)], axis=-2)
 
-def backtracking(f, grad, xk, pk, alpha_bar=ALPHA_BAR, rho=RHO, c=C_ARMIJO, max_backtracks=60):
+def rosenbrock_oracle(maxsize=4):
+    return CachedOracle(rosenbrock, grad_rosenbrock, hess_rosenbrock, maxsize=maxsize)
+
+_LADDERS = {}
+
+def _alpha_ladder(alpha_bar, rho, max_backtracks):
+    key = (alpha_bar, rho, max_backtracks)
+    if key not in _LADDERS:
+        _LADDERS[key] = alpha_bar * rho**np.arange(max_backtracks + 1)
+    return _LADDERS[key]
+
+# fk/gk: values the caller already holds at xk (skips re-evaluation).
+# ladder=True evaluates every step alpha_bar*rho**j in one vectorized f call
+# (f must accept an (M, n) batch) and takes the first Armijo-satisfying one.
+def backtracking(f, grad, xk, pk, alpha_bar=ALPHA_BAR, rho=RHO, c=C_ARMIJO, max_backtracks=MAX_BT,
+                 fk=None, gk=None, ladder=False):
     alpha = alpha_bar
-    fk = f(xk)
-    gk = grad(xk)
+    if fk is None:
+        fk = f(xk)
+    if gk is None:
+        gk = grad(xk)
     slope0 = np.dot(gk, pk)
     if slope0 >= 0:
         pk = -pk
         slope0 = np.dot(gk, pk)
+    if ladder:
+        alphas = _alpha_ladder(alpha_bar, rho, max_backtracks)
+        ok = f(xk + alphas[:, None]*pk) <= fk + c*alphas*slope0
+        bt = int(np.argmax(ok)) if ok.any() else max_backtracks
+        return alphas[bt], pk, bt
     bt = 0
     while f(xk + alpha*pk) > fk + c*alpha*slope0 and bt < max_backtracks:
         alpha *= rho
         bt += 1
     return alpha, pk, bt
 
-def steepest_descent(x0, max_iter=MAX_SD_IT, tol=TOL):
-    x = np.array(x0, dtype=float)
-    records = []
-    for k in range(max_iter):
-        g = grad_rosenbrock(x)
-        gn = np.linalg.norm(g)
-        fval = rosenbrock(x)
-        if gn <= tol:
-            records.append((k, x[0], x[1], fval, gn, np.nan, 0))
+# Expand an Armijo step (alpha /= RHO) until the Wolfe curvature condition
+# g(x + alpha p).p >= c2 g(x).p holds or the Armijo condition would break.
+# Returns (alpha, whether the curvature condition holds at alpha).
+def _extend_to_curvature(oracle, x, p, alpha, fk, slope0, c=C_ARMIJO, c2=C_WOLFE, max_expand=30):
+    for _ in range(max_expand):
+        if oracle.grad_trial(x + alpha*p) @ p >= c2*slope0:
+            return alpha, True
+        trial = alpha / RHO
+        if oracle.f_trial(x + trial*p) > fk + c*trial*slope0:
             break
-        pk = -g
-        alpha, pk_adj, bt = backtracking(rosenbrock, grad_rosenbrock, x, pk)
-        x = x + alpha*pk_adj
-        records.append((k, x[0], x[1], rosenbrock(x), np.linalg.norm(grad_rosenbrock(x)), alpha, bt))
-    return pd.DataFrame(records, columns=["iter","x1","x2","f(x)","||grad||","alpha","backtracks"])
-
-def newton_method(x0, max_iter=MAX_NT_IT, tol=TOL):
-    x = np.array(x0, dtype=float)
-    records = []
-    for k in range(max_iter):
-        g = grad_rosenbrock(x)
-        gn = np.linalg.norm(g)
-        fval = rosenbrock(x)
+        alpha = trial
+    return alpha, False
+
+# wolfe=True for the Armijo searches: an unbacktracked step is first expanded
+# (_extend_to_curvature); a step that still misses the curvature condition, e.g.
+# after backtracking, is handed to strong_wolfe, which brackets and zooms from it.
+# A search that ran out of backtracks found no decrease (f is down to rounding):
+# its step is kept as it is.
+def _enforce_curvature(oracle, x, p, alpha, bt, fk, gk, c2=C_WOLFE):
+    if bt >= MAX_BT:
+        return alpha, p, bt
+    slope0 = gk @ p
+    if bt == 0:
+        alpha, ok = _extend_to_curvature(oracle, x, p, alpha, fk, slope0, c2=c2)
+    else:
+        ok = oracle.grad_trial(x + alpha*p) @ p >= c2*slope0
+    if ok:
+        return alpha, p, bt
+    alpha, p, extra = strong_wolfe(oracle, x, p, fk, gk, alpha, c2=c2)
+    return alpha, p, bt + extra + 1
+
+# Safeguard for interpolated trial steps: keep them inside [lo, hi], bisect on nan
+def _clip_step(a, lo, hi):
+    return 0.5*(lo + hi) if not np.isfinite(a) else min(max(a, lo), hi)
+
+# Minimizer of the cubic through (a, fa, da) and (b, fb, db); nan if it has none
+def _cubicmin(a, fa, da, b, fb, db):
+    d1 = da + db - 3.0*(fa - fb)/(a - b)
+    disc = d1*d1 - da*db
+    if disc < 0:
+        return np.nan
+    d2 = np.copysign(np.sqrt(disc), b - a)
+    den = db - da + 2.0*d2
+    return b - (b - a)*(db + d2 - d1)/den if den != 0 else np.nan
+
+# Armijo backtracking that replaces the fixed ratio RHO by interpolation of
+# phi(alpha) = f(xk + alpha pk): the quadratic through phi(0), phi'(0), phi(alpha0)
+# after the first failure, then the cubic through phi(0), phi'(0) and the last two
+# trials. Each new step is kept in [0.1, 0.5] times the previous one.
+def interp_backtracking(f, xk, pk, fk, gk, alpha0=ALPHA_BAR, c=C_ARMIJO, max_backtracks=MAX_BT):
+    slope0 = np.dot(gk, pk)
+    if slope0 >= 0:
+        pk = -pk
+        slope0 = np.dot(gk, pk)
+    alpha, fa = alpha0, f(xk + alpha0*pk)
+    prev = None
+    bt = 0
+    while fa > fk + c*alpha*slope0 and bt < max_backtracks:
+        ra = fa - fk - slope0*alpha
+        if prev is None:
+            trial = -slope0*alpha*alpha / (2.0*ra)
+        else:
+            a0, f0 = prev
+            r0 = f0 - fk - slope0*a0
+            d = a0*a0*alpha*alpha*(alpha - a0)
+            A = (a0*a0*ra - alpha*alpha*r0) / d
+            B = (alpha**3*r0 - a0**3*ra) / d
+            trial = -slope0/(2.0*B) if A == 0 else (-B + np.sqrt(B*B - 3.0*A*slope0)) / (3.0*A)
+        prev = (alpha, fa)
+        alpha = _clip_step(trial, 0.1*alpha, 0.5*alpha)
+        fa = f(xk + alpha*pk)
+        bt += 1
+    return alpha, pk, bt
+
+# Strong-Wolfe line search (Nocedal & Wright, Alg. 3.5/3.6): expand from alpha0
+# until the step brackets a point with
+#   f(xk + alpha pk) <= fk + c alpha slope0   and   |g(xk + alpha pk).pk| <= c2 |slope0|,
+# then zoom in with safeguarded cubic interpolation of f and its directional
+# derivative. Trials go through oracle.f_trial / grad_trial, so they stay out of the
+# cache; the accepted point's f and g are hits for the caller when it was the last
+# trial. bt counts the trials after the first. stats: a dict that receives
+# fallback=True when the step does not satisfy the curvature condition.
+def strong_wolfe(oracle, xk, pk, fk, gk, alpha0=ALPHA_BAR, c=C_ARMIJO, c2=C_WOLFE, max_evals=40,
+                 stats=None):
+    slope0 = np.dot(gk, pk)
+    if slope0 >= 0:
+        pk = -pk
+        slope0 = np.dot(gk, pk)
+
+    def phi(alpha):
+        xt = xk + alpha*pk
+        return alpha, oracle.f_trial(xt), np.dot(oracle.grad_trial(xt), pk)
+
+    lo, hi = (0.0, fk, slope0), None
+    evals = 0
+    if stats is not None:
+        stats["fallback"] = False
+    alpha = alpha0
+    while evals < max_evals:
+        trial = phi(alpha)
+        evals += 1
+        if trial[1] > fk + c*alpha*slope0 or (evals > 1 and trial[1] >= lo[1]):
+            hi = trial
+            break
+        if abs(trial[2]) <= -c2*slope0:
+            return alpha, pk, evals - 1
+        if trial[2] >= 0:
+            lo, hi = trial, lo
+            break
+        # Extrapolate: cubic step clipped to [2, 10] times the current one
+        step = _cubicmin(*lo, *trial)
+        lo = trial
+        alpha = _clip_step(step, 2.0*alpha, 10.0*alpha)
+
+    while hi is not None and evals < max_evals:
+        a, b = sorted((lo[0], hi[0]))
+        width = b - a
+        if width <= 1e-10*b:
+            break  # f differences are down to rounding: no step can be told apart
+        alpha = _cubicmin(*lo, *hi)
+        if not a + 0.1*width <= alpha <= b - 0.1*width:
+            alpha = 0.5*(a + b)
+        trial = phi(alpha)
+        evals += 1
+        if trial[1] > fk + c*alpha*slope0 or trial[1] >= lo[1]:
+            hi = trial
+            continue
+        if abs(trial[2]) <= -c2*slope0:
+            return alpha, pk, evals - 1
+        if trial[2]*(hi[0] - lo[0]) >= 0:
+            hi = lo
+        lo = trial
+    if stats is not None:
+        stats["fallback"] = True
+    if lo[0] > 0:
+        return lo[0], pk, evals - 1  # sufficient decrease only
+    # Evaluation budget spent without a decrease: plain backtracking below the last trial
+    alpha, pk, bt = backtracking(oracle.f_trial, oracle.grad, xk, pk, alpha_bar=RHO*alpha,
+                                 fk=fk, gk=gk)
+    return alpha, pk, evals + bt
+
+# Shared driver of the line-search methods: direction(x, g) gives the search
+# direction and update(s, y), if given, sees every accepted step (quasi-Newton).
+# Without a caller-supplied recorder the trace comes back as a DataFrame.
+# A sink (trace_sink.CSVSink/ArrowSink) additionally streams every row to disk;
+# pair it with IterHistory(RECORD_DTYPE, last=1) to keep memory flat.
+# Records hold the first two coordinates; for n > 2 use return_x=True
+# (e.g. with oracle=rosenbrock_nd.rosen_nd_oracle()) to get the final iterate.
+# timer=profiling.PhaseTimer() accumulates oracle / linear_solve / line_search /
+# update / bookkeeping time (line_search includes its own trial evaluations).
+# stop=stopping.StopCriteria(...) adds early stopping, checked every stop.every iterations.
+# state=checkpoint.SolverState resumes (or warm-starts) a run; x0 is then ignored and
+# max_iter still counts from the original start. checkpoint=checkpoint.Checkpointer
+# gets the state every checkpoint.every iterations and at the end.
+# line_search: "backtracking" (alpha *= RHO), "ladder" (the same steps, one batched
+# f call), "interp" (backtracking with quadratic/cubic interpolation) or "wolfe"
+# (strong Wolfe, see strong_wolfe). With guess=True the last two start from
+# alpha_prev * slope_prev / slope (clipped to [ALPHA_MIN, ALPHA_BAR]), i.e. the step that
+# repeats the previous first-order decrease; otherwise they try ALPHA_BAR first. After a
+# fallback step or one below ALPHA_MIN the next search starts from ALPHA_BAR again.
+def _descent_loop(x0, direction, max_iter, tol, line_search, oracle, history, sink, return_x,
+                  update=None, wolfe=False, timer=None, stop=None,
+                  name=None, qn=None, state=None, checkpoint=None, guess=False):
+    if line_search not in LINE_SEARCHES:
+        raise ValueError(f"unknown line search {line_search!r}; choose from {LINE_SEARCHES}")
+    phase = phases(timer)
+    if stop is not None:
+        stop.start(oracle)
+    records = IterHistory(RECORD_DTYPE) if history is None else history
+    k0, x, _, qn_state = starting_point(state, x0, name)
+    if qn_state is not None:
+        qn.load_state(qn_state)
+    last = state.step if state is not None and state.solver == name else None
+
+    def snapshot(k):
+        return SolverState(name, x, k, qn=None if qn is None else qn.state(), step=last)
+
+    k_next = k0
+    if k0 < max_iter:
+        with phase("oracle"):
+            fval, g = oracle.evaluate(x)
+            gn = np.linalg.norm(g)
+    for k in range(k0, max_iter):
+        k_next = k + 1
         if gn <= tol:
-            records.append((k, x[0], x[1], fval, gn, np.nan, 0))
+            with phase("bookkeeping"):
+                row = (k, x[0], x[1], fval, gn, np.nan, 0)
+                records.append(row)
+                if sink is not None:
+                    sink.append(row)
             break
-        H = hess_rosenbrock(x)
+        with phase("linear_solve"):
+            pk = direction(x, g)
+        with phase("line_search"):
+            if line_search in ("interp", "wolfe"):
+                alpha0 = ALPHA_BAR
+                slope = abs(g @ pk)
+                if guess and last is not None and slope > 0:
+                    alpha0 = min(ALPHA_BAR, max(ALPHA_MIN, last[0]*last[1]/slope))
+                if line_search == "wolfe":
+                    info = {}
+                    alpha, pk_adj, bt = strong_wolfe(oracle, x, pk, fval, g, alpha0, stats=info)
+                    fallback = info["fallback"]
+                else:
+                    alpha, pk_adj, bt = interp_backtracking(oracle.f_trial, x, pk, fval, g, alpha0)
+                    fallback = bt >= MAX_BT
+                # A fallback or collapsed step says nothing about the scale of the next one
+                last = None if fallback or alpha < ALPHA_MIN else (alpha, slope)
+            else:
+                alpha, pk_adj, bt = backtracking(oracle.f_trial, oracle.grad, x, pk, fk=fval, gk=g,
+                                                 ladder=(line_search == "ladder"))
+            if wolfe and line_search != "wolfe":
+                alpha, pk_adj, bt = _enforce_curvature(oracle, x, pk_adj, alpha, bt, fval, g)
+        x_new = x + alpha*pk_adj
+        with phase("oracle"):
+            fnew, gnew = oracle.evaluate(x_new)
+        if update is not None:
+            with phase("update"):
+                update(x_new - x, gnew - g)
+        # f, g (and ||g||) at the new x carry over to the next iteration
+        x, fval, g = x_new, fnew, gnew
+        with phase("bookkeeping"):
+            gn = np.linalg.norm(g)
+            row = (k, x[0], x[1], fnew, gn, alpha, bt)
+            records.append(row)
+            if sink is not None:
+                sink.append(row)
+        if stop is not None and k % stop.every == 0:
+            if stop.check(k, x, fnew, gn, alpha*np.linalg.norm(pk_adj)):
+                break
+        if checkpoint is not None and checkpoint.due(k_next):
+            checkpoint.save(snapshot(k_next))
+    with phase("bookkeeping"):
+        if checkpoint is not None:
+            checkpoint.save(snapshot(k_next))
+        trace = records.to_frame() if history is None else records
+    return (x, trace) if return_x else trace
+
+# -g carries no step length information, so the interpolating searches reuse the
+# scale of the previous step (guess=True); Newton keeps trying the unit step first.
+def steepest_descent(x0, max_iter=MAX_SD_IT, tol=TOL, line_search="backtracking", oracle=None,
+                     history=None, sink=None, return_x=False, timer=None, stop=None,
+                     state=None, checkpoint=None):
+    if oracle is None:
+        oracle = rosenbrock_oracle()
+    return _descent_loop(x0, lambda x, g: -g, max_iter, tol, line_search, oracle,
+                         history, sink, return_x, timer=timer, stop=stop,
+                         name="steepest_descent", state=state, checkpoint=checkpoint, guess=True)
+
+# hessvec="fd" or a callable hessvec(x, v) switches to Hessian-free Newton-CG
+def newton_method(x0, max_iter=MAX_NT_IT, tol=TOL, line_search="backtracking", oracle=None,
+                  history=None, sink=None, return_x=False, hessvec=None, timer=None,
+                  stop=None, state=None, checkpoint=None):
+    if oracle is None:
+        oracle = rosenbrock_oracle()
+    phase = phases(timer)
+
+    def direction(x, g):
+        if hessvec is not None:
+            return newton_cg_direction(g, hessvec_operator(oracle, x, g, hessvec))
+        with phase("oracle"):
+            H = oracle.hess(x)
         try:
-            pk = -np.linalg.solve(H, g)
+            return -np.linalg.solve(H, g) if isinstance(H, np.ndarray) else -H.solve(g)
         except np.linalg.LinAlgError:
-            pk, *_ = np.linalg.lstsq(H, -g, rcond=None)
-        alpha, pk_adj, bt = backtracking(rosenbrock, grad_rosenbrock, x, pk)
-        x = x + alpha*pk_adj
-        records.append((k, x[0], x[1], rosenbrock(x), np.linalg.norm(grad_rosenbrock(x)), alpha, bt))
-    return pd.DataFrame(records, columns=["iter","x1","x2","f(x)","||grad||","alpha","backtracks"])
+            if isinstance(H, np.ndarray):
+                pk, *_ = np.linalg.lstsq(H, -g, rcond=None)
+                return pk
+            # Singular banded Hessian: no O(n) least-squares, fall back to -g
+            return -g
+
+    return _descent_loop(x0, direction, max_iter, tol, line_search, oracle,
+                         history, sink, return_x, timer=timer, stop=stop,
+                         name="newton_method", state=state, checkpoint=checkpoint)
+
+# Dense inverse-Hessian BFGS update. H0 = (s.y / y.y) I is set at the first
+# update; pairs with s.y <= 0 (possible without wolfe=True) are skipped so H stays PD.
+class InverseBFGS:
+    def __init__(self):
+        self.H = None
+
+    # Arrays for checkpoint.SolverState.qn
+    def state(self):
+        return None if self.H is None else {"H": self.H.copy()}
+
+    def load_state(self, qn):
+        self.H = np.array(qn["H"], dtype=float)
+
+    def direction(self, x, g):
+        return -g if self.H is None else -(self.H @ g)
+
+    def update(self, s, y):
+        sy = s @ y
+        if sy <= 1e-12 * np.linalg.norm(s) * np.linalg.norm(y):
+            return
+        if self.H is None:
+            self.H = (sy / (y @ y)) * np.eye(s.size)
+        r = 1.0 / sy
+        Hy = self.H @ y
+        self.H = self.H - r*(np.outer(s, Hy) + np.outer(Hy, s)) + (r*r*(y @ Hy) + r)*np.outer(s, s)
+
+# L-BFGS: the last m (s, y) pairs in a fixed ring buffer, applied by the two-loop recursion
+class LBFGSMemory:
+    def __init__(self, n, m=10):
+        self.S = np.zeros((m, n))
+        self.Y = np.zeros((m, n))
+        self.rho = np.zeros(m)
+        self.m = m
+        self.head = 0
+        self.count = 0
+
+    def state(self):
+        return {"S": self.S.copy(), "Y": self.Y.copy(), "rho": self.rho.copy(),
+                "head": self.head, "count": self.count}
+
+    def load_state(self, qn):
+        self.S = np.array(qn["S"], dtype=float)
+        self.Y = np.array(qn["Y"], dtype=float)
+        self.rho = np.array(qn["rho"], dtype=float)
+        self.m = len(self.rho)
+        self.head = int(qn["head"])
+        self.count = int(qn["count"])
+
+    def direction(self, x, g):
+        if not self.count:
+            return -g
+        order = [(self.head - 1 - j) % self.m for j in range(self.count)]
+        q = g.copy()
+        a = np.empty(self.count)
+        for j, i in enumerate(order):
+            a[j] = self.rho[i] * (self.S[i] @ q)
+            q -= a[j] * self.Y[i]
+        newest = order[0]
+        q *= (self.S[newest] @ self.Y[newest]) / (self.Y[newest] @ self.Y[newest])
+        for j in range(self.count - 1, -1, -1):
+            i = order[j]
+            b = self.rho[i] * (self.Y[i] @ q)
+            q += (a[j] - b) * self.S[i]
+        return -q
+
+    def update(self, s, y):
+        sy = s @ y
+        if sy <= 1e-12 * np.linalg.norm(s) * np.linalg.norm(y):
+            return
+        self.S[self.head] = s
+        self.Y[self.head] = y
+        self.rho[self.head] = 1.0 / sy
+        self.head = (self.head + 1) % self.m
+        self.count = min(self.count + 1, self.m)
+
+# wolfe=True (default) also enforces the curvature condition (_enforce_curvature),
+# so s.y > 0 and updates are kept; with plain Armijo steps L-BFGS can crawl along
+# the Rosenbrock valley.
+def bfgs(x0, max_iter=MAX_QN_IT, tol=TOL, line_search="backtracking", oracle=None,
+         history=None, sink=None, return_x=False, wolfe=True, timer=None,
+         stop=None, state=None, checkpoint=None):
+    if oracle is None:
+        oracle = rosenbrock_oracle()
+    qn = InverseBFGS()
+    return _descent_loop(x0, qn.direction, max_iter, tol, line_search, oracle,
+                         history, sink, return_x, update=qn.update, wolfe=wolfe, timer=timer,
+                         stop=stop, name="bfgs", qn=qn, state=state, checkpoint=checkpoint)
+
+def lbfgs(x0, max_iter=MAX_QN_IT, tol=TOL, line_search="backtracking", oracle=None,
+          history=None, sink=None, return_x=False, wolfe=True, m=10, timer=None,
+          stop=None, state=None, checkpoint=None):
+    if oracle is None:
+        oracle = rosenbrock_oracle()
+    qn = LBFGSMemory(np.size(x0) if state is None else state.x.size, m)
+    return _descent_loop(x0, qn.direction, max_iter, tol, line_search, oracle,
+                         history, sink, return_x, update=qn.update, wolfe=wolfe, timer=timer,
+                         stop=stop, name="lbfgs", qn=qn, state=state, checkpoint=checkpoint)
+
+# Batched multi-start variants: X0 is an (N, 2) array of starting points.
+# All active starts advance together; converged starts drop out of the batch.
+# The trace is one table with a "start" column (the row of X0) before the usual
+# record columns.
+def backtracking_batch(f, X, P, F, G, alpha_bar=ALPHA_BAR, rho=RHO, c=C_ARMIJO, max_backtracks=MAX_BT,
+                       ladder=False):
+    slope0 = np.einsum('ij,ij->i', G, P)
+    flip = slope0 >= 0
+    P = np.where(flip[:, None], -P, P)
+    slope0 = np.where(flip, -slope0, slope0)
+    if ladder:
+        alphas = _alpha_ladder(alpha_bar, rho, max_backtracks)
+        trial = f(X[:, None, :] + alphas[None, :, None]*P[:, None, :])
+        ok = trial <= F[:, None] + c*alphas[None, :]*slope0[:, None]
+        bt = np.where(ok.any(axis=1), np.argmax(ok, axis=1), max_backtracks)
+        return alphas[bt], P, bt
+    alpha = np.full(len(X), float(alpha_bar))
+    bt = np.zeros(len(X), dtype=int)
+    pending = np.arange(len(X))
+    while pending.size:
+        a = alpha[pending]
+        fail = f(X[pending] + a[:, None]*P[pending]) > F[pending] + c*a*slope0[pending]
+        pending = pending[fail & (bt[pending] < max_backtracks)]
+        alpha[pending] *= rho
+        bt[pending] += 1
+    return alpha, P, bt
+
+def _sd_directions(X, G):
+    return -G
+
+def _newton_directions(X, G):
+    H = hess_rosenbrock(X)
+    try:
+        return -np.linalg.solve(H, G[..., None])[..., 0]
+    except np.linalg.LinAlgError:
+        # At least one singular Hessian in the stack: fall back member by member
+        P = np.empty_like(G)
+        for i in range(len(X)):
+            try:
+                P[i] = -np.linalg.solve(H[i], G[i])
+            except np.linalg.LinAlgError:
+                P[i], *_ = np.linalg.lstsq(H[i], -G[i], rcond=None)
+        return P
+
+def _linesearch_batch(X0, direction, max_iter, tol, line_search):
+    X = np.array(X0, dtype=float).reshape(-1, 2)
+    n = len(X)
+    idx = np.arange(n)
+    F = rosenbrock(X)
+    G = grad_rosenbrock(X)
+    chunks = []
+    for k in range(max_iter):
+        gn = np.linalg.norm(G, axis=1)
+        done = gn <= tol
+        if done.any():
+            m = int(done.sum())
+            chunks.append(np.column_stack([np.full(m, k), idx[done], X[done], F[done], gn[done],
+                                           np.full(m, np.nan), np.zeros(m)]))
+            keep = ~done
+            idx, X, F, G = idx[keep], X[keep], F[keep], G[keep]
+            if not idx.size:
+                break
+        P = direction(X, G)
+        alpha, P, bt = backtracking_batch(rosenbrock, X, P, F, G, ladder=(line_search == "ladder"))
+        X = X + alpha[:, None]*P
+        F = rosenbrock(X)
+        G = grad_rosenbrock(X)
+        chunks.append(np.column_stack([np.full(len(idx), k), idx, X, F, np.linalg.norm(G, axis=1),
+                                       alpha, bt]))
+
+    # One long table for all starts, grouped by start (iterations in order within
+    # a start); start_rows gives the rows of one start without copying
+    import pandas as pd
+    log = np.concatenate(chunks) if chunks else np.empty((0, 8))
+    log = log[np.lexsort((log[:, 0], log[:, 1]))]
+    cols = [log[:, 1].astype(int), log[:, 0].astype(int)] + [log[:, j] for j in range(2, 7)] \
+        + [log[:, 7].astype(int)]
+    return pd.DataFrame(dict(zip(["start"] + RECORD_COLUMNS, cols)))
+
+# Rows of start i in a batch trace: a slice of the table, not a copy
+def start_rows(trace, i):
+    lo, hi = np.searchsorted(trace["start"].to_numpy(), [i, i + 1])
+    return trace.iloc[lo:hi]
+
+def steepest_descent_batch(X0, max_iter=MAX_SD_IT, tol=TOL, line_search="backtracking"):
+    return _linesearch_batch(X0, _sd_directions, max_iter, tol, line_search)
+
+def newton_method_batch(X0, max_iter=MAX_NT_IT, tol=TOL, line_search="backtracking"):
+    return _linesearch_batch(X0, _newton_directions, max_iter, tol, line_search)
 
 if __name__ == "__main__":
+    from trace_sink import CSVSink
+
     x0_easy = (1.2, 1.2)
     x0_hard = (-1.2, 1.0)
-    sd_easy = steepest_descent(x0_easy)
-    sd_hard = steepest_descent(x0_hard)
-    nt_easy = newton_method(x0_easy)
-    nt_hard = newton_method(x0_hard)
-    sd_easy.to_csv("SD_x0_1p2_1p2.csv", index=False)
-    sd_hard.to_csv("SD_x0_-1p2_1.csv", index=False)
-    nt_easy.to_csv("NM_x0_1p2_1p2.csv", index=False)
-    nt_hard.to_csv("NM_x0_-1p2_1.csv", index=False)
+    runs = [(steepest_descent, x0_easy, "SD_x0_1p2_1p2.csv"),
+            (steepest_descent, x0_hard, "SD_x0_-1p2_1.csv"),
+            (newton_method, x0_easy, "NM_x0_1p2_1p2.csv"),
+            (newton_method, x0_hard, "NM_x0_-1p2_1.csv")]
+    for solver, x0, path in runs:
+        with CSVSink(path, RECORD_DTYPE) as sink:
+            solver(x0, history=IterHistory(RECORD_DTYPE, last=1), sink=sink)
     print("Saved CSVs.")
@@ -0,0 +1,84 @@
+# Chained (extended) Rosenbrock in n dimensions with a tridiagonal Hessian
+#   f(x) = sum_i a*(x[i+1] - x[i]^2)^2 + (1 - x[i])^2,  i = 0..n-2
+# f and g are O(n) and accept batches (..., n); the Hessian is kept in banded form.
+import numpy as np
+from scipy.linalg import (cho_solve_banded, cholesky_banded, eigh_tridiagonal, eigvalsh_tridiagonal,
+                          solve_banded)
+
+from oracle import CachedOracle
+
+def rosenbrock_nd(x, a=100.0):
+    xl, xr = x[..., :-1], x[..., 1:]
+    return np.sum(a*(xr - xl**2)**2 + (1.0 - xl)**2, axis=-1)
+
+def rosen_nd_grad(x, a=100.0):
+    xl, xr = x[..., :-1], x[..., 1:]
+    t = xr - xl**2
+    g = np.zeros_like(x, dtype=float)
+    g[..., :-1] = -4.0*a*xl*t - 2.0*(1.0 - xl)
+    g[..., 1:] += 2.0*a*t
+    return g
+
+def rosen_nd_hess(x, a=100.0):
+    xl, xr = x[:-1], x[1:]
+    diag = np.zeros_like(x, dtype=float)
+    diag[:-1] = 12.0*a*xl**2 - 4.0*a*xr + 2.0
+    diag[1:] += 2.0*a
+    return TridiagHessian(diag, -4.0*a*xl)
+
+def rosen_nd_oracle(a=100.0, maxsize=4):
+    return CachedOracle(lambda x: rosenbrock_nd(x, a=a),
+                        lambda x: rosen_nd_grad(x, a=a),
+                        lambda x: rosen_nd_hess(x, a=a), maxsize=maxsize)
+
+# Classic start (-1.2, 1, -1.2, 1, ...)
+def rosen_nd_x0(n):
+    x0 = np.ones(n)
+    x0[::2] = -1.2
+    return x0
+
+class TridiagHessian:
+    # Symmetric tridiagonal matrix (diag: n, off: n-1). Supports B @ v and
+    # O(n) banded solves; LinAlgError is raised like np.linalg on failure.
+    def __init__(self, diag, off):
+        self.diag = diag
+        self.off = off
+        self.shape = (len(diag), len(diag))
+
+    def __matmul__(self, v):
+        out = self.diag * v
+        out[:-1] += self.off * v[1:]
+        out[1:] += self.off * v[:-1]
+        return out
+
+    def shifted(self, s):
+        return TridiagHessian(self.diag + s, self.off)
+
+    def min_eig(self):
+        return float(eigvalsh_tridiagonal(self.diag, self.off, select='i', select_range=(0, 0))[0])
+
+    # Full spectrum (w ascending, V), as np.linalg.eigh gives for a dense matrix
+    def eigh(self):
+        return eigh_tridiagonal(self.diag, self.off, check_finite=False)
+
+    # Upper banded Cholesky factor; fails (LinAlgError) if not positive definite
+    def cholesky(self):
+        ab = np.empty((2, len(self.diag)))
+        ab[0, 0] = 0.0
+        ab[0, 1:] = self.off
+        ab[1] = self.diag
+        return cholesky_banded(ab, check_finite=False)
+
+    def cho_solve(self, cb, g):
+        return cho_solve_banded((cb, False), g, check_finite=False)
+
+    # General banded LU solve (B may be indefinite)
+    def solve(self, g):
+        ab = np.zeros((3, len(self.diag)))
+        ab[0, 1:] = self.off
+        ab[1] = self.diag
+        ab[2, :-1] = self.off
+        return solve_banded((1, 1), ab, g, check_finite=False)
+
+    def todense(self):
+        return np.diag(self.diag) + np.diag(self.off, 1) + np.diag(self.off, -1)
@@ -0,0 +1,161 @@
+# Solver benchmark: every solver x test problem x start point, with wall time,
+# f/grad/Hessian evaluation counts, backtracks and peak traced memory.
+# Results go to JSON (with environment metadata) and CSV; --baseline compares a
+# run against an earlier JSON and exits non-zero on regressions.
+#   python solver_benchmark.py --out bench.json [--baseline old.json]
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from derivatives import derivative_oracle
+from objectives import ackley, branin, rastrigin
+from rosenbrock_linesearch import TOL, bfgs, lbfgs, newton_method, rosenbrock_oracle, steepest_descent
+from rosenbrock_nd import rosen_nd_oracle, rosen_nd_x0
+from tr_dogleg_rosenbrock import POLICY_A, POLICY_B, tr_dogleg
+
+# name -> (oracle factory, start points); a fresh oracle is built for every run
+PROBLEMS = {
+    "rosenbrock": (rosenbrock_oracle, [(-1.2, 1.0), (1.2, 1.2), (-1.5, 2.0)]),
+    "rosenbrock_nd10": (rosen_nd_oracle, [tuple(rosen_nd_x0(10))]),
+    "ackley": (lambda: derivative_oracle(ackley), [(0.9, 1.1), (1.8, -0.7)]),
+    "branin": (lambda: derivative_oracle(branin), [(2.5, 3.0), (-3.0, 12.0), (9.0, 2.0)]),
+    "rastrigin": (lambda: derivative_oracle(rastrigin), [(1.2, -0.9), (0.3, 0.2)]),
+}
+
+def _tr(policy, subproblem="dogleg"):
+    kw = {key: val for key, val in policy.items() if key != "a"}
+    return lambda x0, oracle: tr_dogleg(x0, oracle=oracle, subproblem=subproblem, **kw)
+
+# name -> solver(x0, oracle) returning (x, trace)
+SOLVERS = {
+    "SD": lambda x0, oracle: steepest_descent(x0, oracle=oracle, return_x=True),
+    "NM": lambda x0, oracle: newton_method(x0, oracle=oracle, return_x=True),
+    "SD-W": lambda x0, oracle: steepest_descent(x0, oracle=oracle, return_x=True,
+                                                line_search="wolfe"),
+    "NM-W": lambda x0, oracle: newton_method(x0, oracle=oracle, return_x=True,
+                                             line_search="wolfe"),
+    "TR-A": _tr(POLICY_A),
+    "TR-B": _tr(POLICY_B),
+    "TR-exact": _tr(POLICY_A, "exact"),
+    "TR-2D": _tr(POLICY_A, "subspace"),
+    "BFGS": lambda x0, oracle: bfgs(x0, oracle=oracle, return_x=True),
+    "L-BFGS": lambda x0, oracle: lbfgs(x0, oracle=oracle, return_x=True),
+}
+
+# Counts that must not change between versions for the same code path
+EXACT_KEYS = ("iters", "nfev", "ngev", "nhev", "backtracks")
+
+def _trace_stats(trace):
+    if hasattr(trace, "iloc"):  # line-search DataFrame
+        last = trace.iloc[-1]
+        return {"iters": len(trace), "f*": float(last["f(x)"]),
+                "gnorm": float(last["||grad||"]), "backtracks": int(trace["backtracks"].sum())}
+    last = trace[-1]  # tr_dogleg IterHistory
+    return {"iters": int(last["k"]) + 1, "f*": float(last["f"]),
+            "gnorm": float(last["gnorm"]), "backtracks": None}
+
+def run_one(solver, make_oracle, x0, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        oracle = make_oracle()
+        t0 = time.perf_counter()
+        x, trace = solver(x0, oracle)
+        best = min(best, time.perf_counter() - t0)
+    row = {"n": len(x0), "time": best}
+    row.update(_trace_stats(trace))
+    row["converged"] = row["gnorm"] <= TOL
+    row["x*"] = [float(v) for v in np.asarray(x)[:2]]
+    counts = oracle.counters()
+    row.update({key: counts[key] for key in ("nfev", "ngev", "nhev", "hits")})
+    # Separate traced run: tracemalloc slows the interpreter and would skew the timing
+    tracemalloc.start()
+    try:
+        solver(x0, make_oracle())
+        row["peak_kb"] = tracemalloc.get_traced_memory()[1] / 1024.0
+    finally:
+        tracemalloc.stop()
+    return row
+
+def run_benchmark(problems=None, solvers=None, repeat=3):
+    problems = PROBLEMS if problems is None else {p: PROBLEMS[p] for p in problems}
+    solvers = SOLVERS if solvers is None else {s: SOLVERS[s] for s in solvers}
+    rows = []
+    for pname, (make_oracle, starts) in problems.items():
+        for sname, solver in solvers.items():
+            for x0 in starts:
+                row = {"problem": pname, "solver": sname, "x0": [float(v) for v in x0[:2]]}
+                try:
+                    row.update(run_one(solver, make_oracle, x0, repeat))
+                    row["status"] = "ok"
+                except Exception as exc:
+                    row["status"] = "error"
+                    row["error"] = f"{type(exc).__name__}: {exc}"
+                rows.append(row)
+    return rows
+
+def environment():
+    return {"python": platform.python_version(), "numpy": np.__version__,
+            "platform": platform.platform(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+def write_results(rows, path):
+    import pandas as pd
+    with open(path, "w") as fh:
+        json.dump({"env": environment(), "runs": rows}, fh, indent=1)
+    pd.DataFrame(rows).to_csv(str(path).rsplit(".", 1)[0] + ".csv", index=False)
+
+def _key(row):
+    return row["problem"], row["solver"], tuple(row["x0"])
+
+# Differences against a baseline run: changed counts / status, or time up by more than time_tol
+def compare(baseline, rows, time_tol=0.25):
+    old = {_key(r): r for r in baseline["runs"]}
+    issues = []
+    for row in rows:
+        ref = old.get(_key(row))
+        if ref is None:
+            continue
+        name = "/".join(str(v) for v in _key(row))
+        if ref["status"] != row["status"] or ref.get("converged") != row.get("converged"):
+            issues.append(f"{name}: status {ref['status']}/{ref.get('converged')} -> "
+                          f"{row['status']}/{row.get('converged')}")
+            continue
+        if row["status"] != "ok":
+            continue
+        for key in EXACT_KEYS:
+            if ref.get(key) != row.get(key):
+                issues.append(f"{name}: {key} {ref.get(key)} -> {row.get(key)}")
+        if row["time"] > (1.0 + time_tol) * ref["time"]:
+            issues.append(f"{name}: time {ref['time']*1e3:.2f} ms -> {row['time']*1e3:.2f} ms")
+    return issues
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--out", default="benchmark.json")
+    parser.add_argument("--baseline")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--time-tol", type=float, default=0.25)
+    parser.add_argument("--problems", nargs="*")
+    parser.add_argument("--solvers", nargs="*")
+    args = parser.parse_args()
+
+    rows = run_benchmark(args.problems, args.solvers, args.repeat)
+    write_results(rows, args.out)
+    for row in rows:
+        if row["status"] != "ok":
+            print(f"{row['problem']:16s} {row['solver']:7s} {row['x0']}  {row['error']}")
+            continue
+        print(f"{row['problem']:16s} {row['solver']:7s} {str(row['x0']):14s} "
+              f"iters={row['iters']:5d} conv={int(row['converged'])} "
+              f"nfev={row['nfev']:5d} ngev={row['ngev']:5d} nhev={row['nhev']:4d} "
+              f"bt={row['backtracks'] if row['backtracks'] is not None else '-':>5} "
+              f"time={row['time']*1e3:8.2f} ms peak={row['peak_kb']:8.1f} KiB")
+    if args.baseline:
+        with open(args.baseline) as fh:
+            issues = compare(json.load(fh), rows, args.time_tol)
+        print("\n".join(issues) if issues else "no regressions against " + args.baseline)
+        sys.exit(1 if issues else 0)
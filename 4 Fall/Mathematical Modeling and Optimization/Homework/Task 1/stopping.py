@@ -0,0 +1,68 @@
+# Early stopping for the solver loops (stop=StopCriteria(...)).
+# The solvers only test `k % stop.every` in the hot loop; the criteria below run
+# every `every` iterations, after the iteration's row has been recorded:
+#   ftol        relative f decrease since the previous check
+#               (f_prev - f) / max(|f_prev|, |f|, 1) <= ftol
+#   xtol        last step ||s|| <= xtol * max(1, ||x||) (accepted TR steps only)
+#   min_radius  trust radius below min_radius (tr_dogleg)
+#   max_time    wall-clock seconds since the solver started
+#   max_fev     oracle.nfev budget
+#   callback    callback(info) -> truthy to stop; info holds k, x, f, gnorm,
+#               step, Delta, elapsed and nfev
+# After the run, stop.reason names the criterion that fired (None otherwise) and
+# stop.k the iteration. start() resets the state, so one object can be reused for
+# consecutive runs (e.g. as a policy kwarg in experiment_runner).
+import math
+import time
+
+class StopCriteria:
+    def __init__(self, ftol=None, xtol=None, min_radius=None, max_time=None, max_fev=None,
+                 callback=None, every=1):
+        self.ftol = ftol
+        self.xtol = xtol
+        self.min_radius = min_radius
+        self.max_time = max_time
+        self.max_fev = max_fev
+        self.callback = callback
+        self.every = int(every)
+        self.start()
+
+    def start(self, oracle=None):
+        self.oracle = oracle
+        self.reason = None
+        self.k = None
+        self._t0 = time.perf_counter()
+        self._f_prev = None
+
+    def _fires(self, k, x, f, gnorm, step, Delta):
+        if self.min_radius is not None and Delta is not None and Delta < self.min_radius:
+            return "min_radius"
+        if self.max_fev is not None and getattr(self.oracle, "nfev", 0) >= self.max_fev:
+            return "max_fev"
+        elapsed = time.perf_counter() - self._t0
+        if self.max_time is not None and elapsed >= self.max_time:
+            return "max_time"
+        if step is not None:
+            # Rejected TR steps (step=None) leave f unchanged: no stagnation verdict then
+            f_prev, self._f_prev = self._f_prev, f
+            if (self.ftol is not None and f_prev is not None
+                    and f_prev - f <= self.ftol * max(abs(f_prev), abs(f), 1.0)):
+                return "ftol"
+            if self.xtol is not None:
+                xn = math.sqrt(float(x @ x))
+                if step <= self.xtol * max(1.0, xn):
+                    return "xtol"
+        if self.callback is not None:
+            info = {"k": k, "x": x, "f": f, "gnorm": gnorm, "step": step, "Delta": Delta,
+                    "elapsed": elapsed, "nfev": getattr(self.oracle, "nfev", None)}
+            if self.callback(info):
+                return "callback"
+        return None
+
+    def check(self, k, x, f, gnorm, step, Delta=None):
+        reason = self._fires(k, x, f, gnorm, step, Delta)
+        if reason is not None:
+            self.reason = reason
+            self.k = k
+            return True
+        return False
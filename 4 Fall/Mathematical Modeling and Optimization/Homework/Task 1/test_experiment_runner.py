@@ -0,0 +1,29 @@
+import os
+
+import numpy as np
+
+from experiment_runner import make_grid, run_grid
+from rosenbrock_linesearch import steepest_descent
+
+# Kills its worker process at the origin, solves normally everywhere else
+def crash_at_origin(x0, **kw):
+    if x0 == (0.0, 0.0):
+        os._exit(1)
+    return steepest_descent(x0, max_iter=20)
+
+def test_only_the_crashing_task_is_marked_crashed():
+    starts = [(x1, x2) for x1 in np.linspace(-2.0, 2.0, 9) for x2 in np.linspace(-2.0, 2.0, 9)]
+    grid = make_grid({"SD": crash_at_origin}, starts)
+    table = run_grid({"SD": crash_at_origin}, grid, max_workers=4)
+    assert len(table) == 81
+    crashed = table[table["status"] == "crashed"]
+    assert list(crashed["x0"]) == [(0.0, 0.0)]
+    assert (table.drop(crashed.index)["status"] == "ok").all()
+
+def test_crash_in_every_chunk_position():
+    # The crashing task alone in its chunk, mid-chunk, and in a single chunk of all tasks
+    starts = [(-1.0, 1.0), (0.0, 0.0), (1.5, 1.5), (0.5, -0.5)]
+    grid = make_grid({"SD": crash_at_origin}, starts)
+    for chunksize in (1, 3, 81):
+        table = run_grid({"SD": crash_at_origin}, grid, max_workers=2, chunksize=chunksize)
+        assert list(table["status"]) == ["ok", "crashed", "ok", "ok"]
@@ -3,7 +3,16 @@
 # English comments; exact gradient/Hessian; two policies
 
 # Imports
+import math
+
 import numpy as np
+from scipy.linalg import cho_factor, cho_solve
+
+from checkpoint import SolverState, starting_point
+from hessfree import hessvec_operator, steihaug_cg
+from history import IterHistory
+from oracle import CachedOracle
+from profiling import phases
 
 # Rosenbrock objective, gradient, Hessian (a=100 by default)
 def rosenbrock(x, a=100.0):
@@ -23,12 +32,78 @@ def rosen_hess(x, a=100.0):
     H22 =  2.0*a
     return np.array([[H11, H12],[H12, H22]], dtype=float)
 
+def rosen_oracle(a=100.0, maxsize=4):
+    return CachedOracle(lambda x: rosenbrock(x, a=a),
+                        lambda x: rosen_grad(x, a=a),
+                        lambda x: rosen_hess(x, a=a), maxsize=maxsize)
+
+# Closed-form smallest eigenvalue of a symmetric 2x2 / 3x3 matrix
+def _min_eig_small(B):
+    if B.shape[0] == 2:
+        a, b, c = float(B[0, 0]), float(B[0, 1]), float(B[1, 1])
+        return 0.5*(a + c) - math.hypot(0.5*(a - c), b)
+    # 3x3: trigonometric solution of the characteristic cubic
+    a, b, c = float(B[0, 0]), float(B[0, 1]), float(B[0, 2])
+    d, e, f = float(B[1, 1]), float(B[1, 2]), float(B[2, 2])
+    q = (a + d + f) / 3.0
+    p1 = b*b + c*c + e*e
+    p2 = (a - q)**2 + (d - q)**2 + (f - q)**2 + 2.0*p1
+    if p2 == 0.0:
+        return q
+    p = math.sqrt(p2 / 6.0)
+    # r = det((B - q I) / p) / 2
+    a, d, f = (a - q) / p, (d - q) / p, (f - q) / p
+    b, c, e = b / p, c / p, e / p
+    r = 0.5*(a*(d*f - e*e) - b*(b*f - c*e) + c*(b*e - c*d))
+    phi = math.acos(min(1.0, max(-1.0, r))) / 3.0
+    return q + 2.0*p*math.cos(phi + 2.0*math.pi/3.0)
+
+# Closed-form solve B x = g for symmetric 2x2 / 3x3 B (adjugate / det)
+def _solve_small(B, g):
+    if B.shape[0] == 2:
+        a, b, c = float(B[0, 0]), float(B[0, 1]), float(B[1, 1])
+        g1, g2 = float(g[0]), float(g[1])
+        det = a*c - b*b
+        return np.array([(c*g1 - b*g2) / det, (a*g2 - b*g1) / det])
+    a, b, c = float(B[0, 0]), float(B[0, 1]), float(B[0, 2])
+    d, e, f = float(B[1, 1]), float(B[1, 2]), float(B[2, 2])
+    A00, A01, A02 = d*f - e*e, c*e - b*f, b*e - c*d
+    A11, A12, A22 = a*f - c*c, b*c - a*e, a*d - b*b
+    det = a*A00 + b*A01 + c*A02
+    g1, g2, g3 = float(g[0]), float(g[1]), float(g[2])
+    return np.array([A00*g1 + A01*g2 + A02*g3,
+                     A01*g1 + A11*g2 + A12*g3,
+                     A02*g1 + A12*g2 + A22*g3]) / det
+
 # Dogleg step (with tiny PD shift if needed)
 def dogleg_step(g, B, Delta, eps_pd=1e-12):
-    # Ensure positive definiteness numerically
-    w, V = np.linalg.eigh(B)
-    if np.min(w) <= eps_pd:
-        B = B + (eps_pd - np.min(w) + 1e-8) * np.eye(B.shape[0])
+    # Ensure positive definiteness numerically, then take the full Newton step.
+    # n <= 3: closed-form eigenvalue bound and inverse (no LAPACK calls).
+    # n > 3: one Cholesky (cho_factor), reused for the Newton step by two
+    # triangular solves (cho_solve); its failure signals indefiniteness and only
+    # then is the spectrum computed for the shift. Banded B (rosenbrock_nd.TridiagHessian)
+    # follows the same pattern with O(n) banded routines.
+    n = B.shape[0]
+    if not isinstance(B, np.ndarray):
+        try:
+            cb = B.cholesky()
+        except np.linalg.LinAlgError:
+            B = B.shifted(eps_pd - B.min_eig() + 1e-8)
+            cb = B.cholesky()
+        pB = -B.cho_solve(cb, g)
+    elif n <= 3:
+        lam = _min_eig_small(B)
+        if lam <= eps_pd:
+            B = B + (eps_pd - lam + 1e-8) * np.eye(n)
+        pB = -_solve_small(B, g)
+    else:
+        try:
+            cf = cho_factor(B, lower=True, check_finite=False)
+        except np.linalg.LinAlgError:
+            lam = np.linalg.eigvalsh(B)[0]
+            B = B + (eps_pd - lam + 1e-8) * np.eye(n)
+            cf = cho_factor(B, lower=True, check_finite=False)
+        pB = -cho_solve(cf, g, check_finite=False)
 
     # Cauchy point on the ray -g
     gBg = float(g @ (B @ g))
@@ -39,7 +114,6 @@ def dogleg_step(g, B, Delta, eps_pd=1e-12):
         pU = -alpha_sd * g
 
     # Full Newton step
-    pB = -np.linalg.solve(B, g)
     if np.linalg.norm(pB) <= Delta:
         return pB
 
@@ -55,30 +129,161 @@ def dogleg_step(g, B, Delta, eps_pd=1e-12):
     t = cand[0] if cand else min(max(t1, 0.0), 1.0)
     return pU + t * d
 
+# Exact subproblem min g.p + 0.5 p.B.p, ||p|| <= Delta (More-Sorensen), solved in
+# the eigenbasis B = V diag(w) V^T: p(lam) = -V (V^T g) / (w + lam) with the
+# smallest lam >= max(0, -w[0]) such that ||p(lam)|| <= Delta. lam comes from
+# safeguarded Newton on 1/||p(lam)|| - 1/Delta inside the bracket [lo, hi].
+# Indefinite B is handled without any artificial shift; in the hard case
+# (g orthogonal to the lowest eigenvectors) the step is completed along V[:, 0].
+def exact_step(g, B, Delta, rtol=1e-10, maxiter=50):
+    if isinstance(B, np.ndarray):
+        w, V = np.linalg.eigh(B)
+    elif hasattr(B, "eigh"):
+        w, V = B.eigh()
+    else:
+        raise ValueError("the exact subproblem needs an explicit Hessian; use subproblem='steihaug'")
+    gt = V.T @ g
+    if w[0] > 0:
+        p = -V @ (gt / w)
+        if np.linalg.norm(p) <= Delta:
+            return p
+    lo = max(0.0, -w[0])
+    gnorm = np.linalg.norm(g)
+    scale = max(1.0, abs(w[0]), abs(w[-1]))
+    low = w - w[0] <= 1e-12*scale
+    if lo > 0 and np.all(np.abs(gt[low]) <= 1e-12*max(gnorm, scale)):
+        p = -V[:, ~low] @ (gt[~low] / (w[~low] + lo))
+        pp = float(p @ p)
+        if pp <= Delta**2:
+            return p + math.sqrt(Delta**2 - pp) * V[:, 0]
+    hi = lo + gnorm / Delta
+    lam = hi
+    for _ in range(maxiter):
+        d = w + lam
+        u = gt / d
+        pn = np.linalg.norm(u)
+        if abs(pn - Delta) <= rtol*Delta:
+            break
+        if pn > Delta:
+            lo = lam
+        else:
+            hi = lam
+        qq = float(np.sum(u*u / d))
+        lam_new = lam + (pn/Delta) * (pn - Delta) * pn / qq if qq > 0 else 0.5*(lo + hi)
+        lam = lam_new if lo < lam_new < hi else 0.5*(lo + hi)
+    return -V @ (gt / (w + lam))
+
+# Two-dimensional subspace step: the exact subproblem restricted to span{g, d},
+# d = B^{-1} g, or (B + s I)^{-1} g with s = -1.5 w_min when B is indefinite
+# (Nocedal & Wright, sec. 4.1). Only one solve and two products with B are
+# needed besides the smallest eigenvalue, so it also works on banded Hessians.
+def subspace_step(g, B, Delta, eps_pd=1e-12):
+    n = B.shape[0]
+    if not isinstance(B, np.ndarray):
+        if not hasattr(B, "min_eig"):
+            raise ValueError("the 2D subspace step needs an explicit Hessian; "
+                             "use subproblem='steihaug'")
+        lam = B.min_eig()
+        s = 0.0 if lam > eps_pd else 1e-8 - 1.5*min(lam, 0.0)
+        d = (B if s == 0.0 else B.shifted(s)).solve(g)
+    elif n <= 3:
+        lam = _min_eig_small(B)
+        s = 0.0 if lam > eps_pd else 1e-8 - 1.5*min(lam, 0.0)
+        d = _solve_small(B + s*np.eye(n) if s else B, g)
+    else:
+        lam = np.linalg.eigvalsh(B)[0]
+        s = 0.0 if lam > eps_pd else 1e-8 - 1.5*min(lam, 0.0)
+        d = np.linalg.solve(B + s*np.eye(n) if s else B, g)
+    # Orthonormal basis of span{g, d}; a single column if d is parallel to g
+    gnorm = np.linalg.norm(g)
+    q1 = g / gnorm
+    r = d - (q1 @ d)*q1
+    rn = np.linalg.norm(r)
+    Q = np.column_stack((q1, r / rn)) if rn > 1e-10*np.linalg.norm(d) else q1[:, None]
+    BQ = np.column_stack([B @ Q[:, j] for j in range(Q.shape[1])])
+    B2 = Q.T @ BQ
+    return Q @ exact_step(Q.T @ g, 0.5*(B2 + B2.T), Delta)
+
+SUBPROBLEMS = ("dogleg", "exact", "subspace", "steihaug")
+
+# History rows: hist[i]['k'], hist[i]['x1'], hist[i]['x2'], ... (hist.to_frame() for a table).
+# Like the line-search records only the first two coordinates are kept, so the history
+# does not grow with n (tr_dogleg returns the final x). full_x=True stores the whole
+# iterate in an 'x' field instead: n floats per row.
+def tr_history_dtype(n=2, full_x=False):
+    if full_x:
+        return [('k', np.int64), ('x', float, (n,)), ('f', float), ('gnorm', float),
+                ('Delta', float)]
+    return [('k', np.int64), ('x1', float), ('x2', float), ('f', float), ('gnorm', float),
+            ('Delta', float)]
+
 # Trust-region loop (Dogleg)
 def tr_dogleg(x0, a=100.0, Delta0=1.0, Deltamax=100.0,
               rho_lo=0.25, rho_hi=0.75, eta=0.0,
-              shrink=0.25, grow=2.0, gtol=1e-8, maxit=200):
-    x = np.array(x0, dtype=float).reshape(2)
-    Delta = float(Delta0)
-    hist = []
-    for k in range(maxit):
-        f = rosenbrock(x, a=a)
-        g = rosen_grad(x, a=a)
-        B = rosen_hess(x, a=a)
-        gnorm = np.linalg.norm(g)
-        hist.append({'k': k, 'x': x.copy(), 'f': f, 'gnorm': gnorm, 'Delta': Delta})
+              shrink=0.25, grow=2.0, gtol=1e-8, maxit=200, oracle=None,
+              history=None, sink=None, subproblem="dogleg", hessvec=None, timer=None,
+              stop=None, state=None, checkpoint=None, stats=None, full_x=False):
+    # A rejected step leaves x unchanged, so f/g/B come straight from the cache.
+    # subproblem: "dogleg" (default), "exact" (More-Sorensen, see exact_step),
+    # "subspace" (2D subspace minimization) or "steihaug" (truncated CG); with
+    # "steihaug", hessvec="fd" or a callable hessvec(x, v) means no Hessian is ever formed.
+    # stats: a dict that receives the accepted / rejected step counts of this call.
+    # full_x=True records every iterate in the history (see tr_history_dtype); a
+    # caller-supplied history or sink must then use tr_history_dtype(n, full_x=True).
+    # timer=profiling.PhaseTimer() splits the time into oracle / linear_solve
+    # (the subproblem, including its shift and eigenvalue check) / bookkeeping.
+    # stop=stopping.StopCriteria(min_radius=..., ...) ends the run early, e.g. once
+    # Delta has collapsed; it is checked every stop.every iterations.
+    # state=checkpoint.SolverState resumes from (k, x, Delta) or warm-starts (state.warm(),
+    # possibly with another a); checkpoint=checkpoint.Checkpointer receives the state.
+    if subproblem not in SUBPROBLEMS:
+        raise ValueError(f"unknown subproblem {subproblem!r}; choose from {SUBPROBLEMS}")
+    if hessvec is not None and subproblem != "steihaug":
+        raise ValueError(f"{subproblem} needs an explicit Hessian; use subproblem='steihaug'")
+    if oracle is None:
+        oracle = rosen_oracle(a)
+    phase = phases(timer)
+    if stop is not None:
+        stop.start(oracle)
+    k0, x, Delta, _ = starting_point(state, x0, "tr_dogleg")
+    Delta = float(Delta0) if Delta is None else Delta
+    hist = IterHistory(tr_history_dtype(x.size, full_x)) if history is None else history
+    accepted_steps = rejected_steps = 0
+    k_next = k0
+    for k in range(k0, maxit):
+        k_next = k + 1
+        with phase("oracle"):
+            if hessvec is None:
+                f, g, B = oracle.evaluate(x, hess=True)
+            else:
+                f, g = oracle.evaluate(x)
+                B = hessvec_operator(oracle, x, g, hessvec)
+            gnorm = np.linalg.norm(g)
+        with phase("bookkeeping"):
+            row = (k, x, f, gnorm, Delta) if full_x else (k, x[0], x[1], f, gnorm, Delta)
+            hist.append(row)
+            if sink is not None:
+                sink.append(row)
         if gnorm < gtol:
             break
 
-        p = dogleg_step(g, B, Delta)
+        with phase("linear_solve"):
+            if subproblem == "steihaug":
+                p = steihaug_cg(g, B, Delta)
+            elif subproblem == "exact":
+                p = exact_step(g, B, Delta)
+            elif subproblem == "subspace":
+                p = subspace_step(g, B, Delta)
+            else:
+                p = dogleg_step(g, B, Delta)
 
         # Predicted reduction
         mp = f + g @ p + 0.5 * p @ (B @ p)
         pred = f - mp
 
         # Actual reduction
-        f_new = rosenbrock(x + p, a=a)
+        with phase("oracle"):
+            f_new = oracle.f_trial(x + p)
         ared = f - f_new
 
         # Ratio
@@ -91,26 +296,145 @@ def tr_dogleg(x0, a=100.0, Delta0=1.0, Deltamax=100.0,
             Delta = min(grow * Delta, Deltamax)
 
         # Accept/reject
-        if rho > eta:
+        accepted = rho > eta
+        if accepted:
             x = x + p
+            accepted_steps += 1
+        else:
+            rejected_steps += 1
 
+        if stop is not None and k % stop.every == 0:
+            if stop.check(k, x, f_new if accepted else f, gnorm,
+                          np.linalg.norm(p) if accepted else None, Delta):
+                break
+        if checkpoint is not None and checkpoint.due(k_next):
+            checkpoint.save(SolverState("tr_dogleg", x, k_next, Delta))
+
+    if checkpoint is not None:
+        checkpoint.save(SolverState("tr_dogleg", x, k_next, Delta))
+    if stats is not None:
+        stats.update(accepted=accepted_steps, rejected=rejected_steps)
     return x, hist
 
+# Radius-update policies compared in __main__ (and by experiment_runner.py)
+POLICY_A = dict(a=100.0, Delta0=1.0, Deltamax=100.0,
+                rho_lo=0.25, rho_hi=0.75, eta=0.0,
+                shrink=0.25, grow=2.0, gtol=1e-8, maxit=200)
+POLICY_B = dict(a=100.0, Delta0=0.5, Deltamax=50.0,
+                rho_lo=0.20, rho_hi=0.80, eta=1e-3,
+                shrink=0.50, grow=1.50, gtol=1e-8, maxit=200)
+
+# Batched dogleg: X0 is (N, 2); a, Delta0, ..., grow may be scalars or (N,) arrays,
+# so one pass can cover a start-point grid under several policies (see policy_grid).
+def _rosen_fgh_batch(X, a):
+    x1, x2 = X[:, 0], X[:, 1]
+    t = x2 - x1**2
+    f = a*t**2 + (1.0 - x1)**2
+    G = np.column_stack([-4.0*a*x1*t - 2.0*(1.0 - x1), 2.0*a*t])
+    H11 = -4.0*a*t + 8.0*a*x1**2 + 2.0
+    H12 = -4.0*a*x1
+    H22 = np.broadcast_to(2.0*a, x1.shape)
+    return f, G, (H11, H12, H22)
+
+# Stacked closed-form dogleg_step for 2x2 models (B given by its entries b11, b12, b22)
+def dogleg_step_batch(G, Bent, Delta, eps_pd=1e-12):
+    b11, b12, b22 = Bent
+    g1, g2 = G[:, 0], G[:, 1]
+    lam = 0.5*(b11 + b22) - np.hypot(0.5*(b11 - b22), b12)
+    shift = np.where(lam <= eps_pd, eps_pd - lam + 1e-8, 0.0)
+    b11, b22 = b11 + shift, b22 + shift
+    det = b11*b22 - b12*b12
+    pB = np.column_stack([-(b22*g1 - b12*g2) / det, -(b11*g2 - b12*g1) / det])
+
+    gg = g1*g1 + g2*g2
+    gBg = g1*(b11*g1 + b12*g2) + g2*(b12*g1 + b22*g2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scale = np.where(gBg <= 0, Delta / (np.sqrt(gg) + 1e-16), gg / gBg)
+    pU = -scale[:, None] * G
+
+    d = pB - pU
+    qa = np.einsum('ij,ij->i', d, d)
+    qb = 2.0*np.einsum('ij,ij->i', pU, d)
+    qc = np.einsum('ij,ij->i', pU, pU) - Delta**2
+    root = np.sqrt(np.maximum(0.0, qb*qb - 4.0*qa*qc))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t1 = np.where(qa > 0, (-qb + root) / (2.0*qa), 0.0)
+        t2 = np.where(qa > 0, (-qb - root) / (2.0*qa), 0.0)
+    t = np.where((t1 >= 0) & (t1 <= 1), t1,
+                 np.where((t2 >= 0) & (t2 <= 1), t2, np.clip(t1, 0.0, 1.0)))
+    inside = np.linalg.norm(pB, axis=1) <= Delta
+    return np.where(inside[:, None], pB, pU + t[:, None]*d)
+
+def tr_dogleg_batch(X0, a=100.0, Delta0=1.0, Deltamax=100.0,
+                    rho_lo=0.25, rho_hi=0.75, eta=0.0,
+                    shrink=0.25, grow=2.0, gtol=1e-8, maxit=200):
+    X = np.array(X0, dtype=float).reshape(-1, 2)
+    N = len(X)
+    par = [np.broadcast_to(np.asarray(v, dtype=float), (N,)).copy()
+           for v in (a, Deltamax, rho_lo, rho_hi, eta, shrink, grow)]
+    Delta = np.broadcast_to(np.asarray(Delta0, dtype=float), (N,)).copy()
+    info = {"iters": np.full(N, maxit), "f": np.empty(N), "gnorm": np.empty(N),
+            "accepted": np.zeros(N, dtype=int), "rejected": np.zeros(N, dtype=int),
+            "converged": np.zeros(N, dtype=bool)}
+    idx = np.arange(N)
+    for k in range(maxit):
+        av, Dmax, lo, hi, et, shr, gr = (v[idx] for v in par)
+        Xa, Da = X[idx], Delta[idx]
+        f, G, Bent = _rosen_fgh_batch(Xa, av)
+        gnorm = np.linalg.norm(G, axis=1)
+        info["f"][idx], info["gnorm"][idx] = f, gnorm
+        done = gnorm < gtol
+        if done.any():
+            info["iters"][idx[done]] = k + 1
+            info["converged"][idx[done]] = True
+            keep = ~done
+            idx, Xa, Da, f, G, gnorm = idx[keep], Xa[keep], Da[keep], f[keep], G[keep], gnorm[keep]
+            av, Dmax, lo, hi, et, shr, gr = av[keep], Dmax[keep], lo[keep], hi[keep], et[keep], shr[keep], gr[keep]
+            Bent = tuple(b[keep] for b in Bent)
+            if not idx.size:
+                break
+
+        P = dogleg_step_batch(G, Bent, Da)
+        b11, b12, b22 = Bent
+        p1, p2 = P[:, 0], P[:, 1]
+        pBp = p1*(b11*p1 + b12*p2) + p2*(b12*p1 + b22*p2)
+        pred = f - (f + np.einsum('ij,ij->i', G, P) + 0.5*pBp)
+        ared = f - _rosen_fgh_batch(Xa + P, av)[0]
+        rho = ared / (pred + 1e-16)
+
+        pn = np.linalg.norm(P, axis=1)
+        Da = np.where(rho < lo, Da*shr,
+                      np.where((rho > hi) & (pn >= Da - 1e-14), np.minimum(gr*Da, Dmax), Da))
+        acc = rho > et
+        X[idx] = np.where(acc[:, None], Xa + P, Xa)
+        Delta[idx] = Da
+        info["accepted"][idx] += acc
+        info["rejected"][idx] += ~acc
+    info["Delta"] = Delta
+    return X, info
+
+# Stack starts x policies for tr_dogleg_batch: returns (X0, kwargs, labels)
+def policy_grid(starts, policies):
+    starts = np.asarray(starts, dtype=float).reshape(-1, 2)
+    names = list(policies)
+    keys = sorted({key for pol in policies.values() for key in pol} - {"gtol", "maxit"})
+    X0 = np.tile(starts, (len(names), 1))
+    kwargs = {key: np.repeat([policies[name][key] for name in names], len(starts))
+              for key in keys}
+    labels = np.repeat(names, len(starts))
+    return X0, kwargs, labels
+
 if __name__ == "__main__":
     x0 = [-1.2, 1.0]
-    xA, H_A = tr_dogleg(x0, a=100.0, Delta0=1.0, Deltamax=100.0,
-                        rho_lo=0.25, rho_hi=0.75, eta=0.0,
-                        shrink=0.25, grow=2.0, gtol=1e-8, maxit=200)
-    xB, H_B = tr_dogleg(x0, a=100.0, Delta0=0.5, Deltamax=50.0,
-                        rho_lo=0.20, rho_hi=0.80, eta=1e-3,
-                        shrink=0.50, grow=1.50, gtol=1e-8, maxit=200)
+    xA, H_A = tr_dogleg(x0, **POLICY_A)
+    xB, H_B = tr_dogleg(x0, **POLICY_B)
 
     def tail(hist):
         last = hist[-1]
-        return last['k'], last['x'], last['f'], last['gnorm'], last['Delta']
+        return last['k'], last['f'], last['gnorm'], last['Delta']
 
-    kA, xA_last, fA, gA, DA = tail(H_A)
-    kB, xB_last, fB, gB, DB = tail(H_B)
+    kA, fA, gA, DA = tail(H_A)
+    kB, fB, gB, DB = tail(H_B)
 
-    print("Policy A:", f"iters={kA+1}, x*={xA_last}, f*={fA:.3e}, ||g||={gA:.2e}, Δ={DA:.3f}")
-    print("Policy B:", f"iters={kB+1}, x*={xB_last}, f*={fB:.3e}, ||g||={gB:.2e}, Δ={DB:.3f}")
\ No newline at end of file
+    print("Policy A:", f"iters={kA+1}, x*={xA}, f*={fA:.3e}, ||g||={gA:.2e}, Δ={DA:.3f}")
+    print("Policy B:", f"iters={kB+1}, x*={xB}, f*={fB:.3e}, ||g||={gB:.2e}, Δ={DB:.3f}")
\ No newline at end of file
@@ -0,0 +1,128 @@
+# Streaming writers for solver traces (rows are flushed to disk in batches)
+import csv
+import time
+
+import numpy as np
+
+# (column name, scalar dtype) pairs; vector fields such as x become x1, x2, ...
+def _flat_fields(dtype):
+    fields = []
+    for name in dtype.names:
+        dt = dtype.fields[name][0]
+        if dt.shape:
+            fields += [(f"{name}{j+1}", dt.base) for j in range(dt.shape[0])]
+        else:
+            fields.append((name, dt))
+    return fields
+
+class TraceSink:
+    # Buffers up to `batch` rows of `dtype` (same row tuples as IterHistory) and writes
+    # them out when the buffer fills or `flush_interval` seconds have passed.
+    def __init__(self, path, dtype, batch=256, flush_interval=None):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.fields = _flat_fields(self.dtype)
+        self.columns = [name for name, _ in self.fields]
+        self.flush_interval = flush_interval
+        self._buf = np.empty(batch, dtype=self.dtype)
+        self._n = 0
+        self._last_flush = time.monotonic()
+        self.rows_written = 0
+
+    def append(self, row):
+        self._buf[self._n] = row
+        self._n += 1
+        if self._n == len(self._buf) or (
+                self.flush_interval is not None
+                and time.monotonic() - self._last_flush >= self.flush_interval):
+            self.flush()
+
+    def _columns(self, arr):
+        cols = []
+        for name in self.dtype.names:
+            col = arr[name]
+            cols += [col[:, j] for j in range(col.shape[1])] if col.ndim > 1 else [col]
+        return cols
+
+    def flush(self):
+        if self._n:
+            self._write(self._columns(self._buf[:self._n]))
+            self.rows_written += self._n
+            self._n = 0
+        self._last_flush = time.monotonic()
+
+    def _write(self, cols):
+        raise NotImplementedError
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class CSVSink(TraceSink):
+    # Same layout as DataFrame.to_csv(index=False): header row, NaN written as empty
+    def __init__(self, path, dtype, batch=256, flush_interval=None):
+        super().__init__(path, dtype, batch, flush_interval)
+        self._file = open(path, "w", newline="")
+        self._writer = csv.writer(self._file, lineterminator="\n")
+        self._writer.writerow(self.columns)
+        self._file.flush()
+
+    def _write(self, cols):
+        lists = []
+        for col in cols:
+            vals = col.tolist()
+            if col.dtype.kind == "f":
+                vals = ["" if v != v else v for v in vals]
+            lists.append(vals)
+        self._writer.writerows(zip(*lists))
+        self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            super().close()
+            self._file.close()
+
+# Columnar binary trace in the Arrow IPC stream format (requires pyarrow).
+# Each flush appends one record batch; unlike Parquet there is no footer, so a
+# killed run still leaves every completed batch readable (see read_trace).
+class ArrowSink(TraceSink):
+    def __init__(self, path, dtype, batch=4096, flush_interval=None):
+        import pyarrow as pa
+        super().__init__(path, dtype, batch, flush_interval)
+        self._pa = pa
+        self._schema = pa.schema([(name, pa.from_numpy_dtype(dt)) for name, dt in self.fields])
+        self._sink = pa.OSFile(path, "wb")
+        self._writer = pa.ipc.new_stream(self._sink, self._schema)
+
+    def _write(self, cols):
+        pa = self._pa
+        batch = pa.record_batch([pa.array(c) for c in cols], schema=self._schema)
+        self._writer.write_batch(batch)
+        self._sink.flush()
+
+    def close(self):
+        if not self._sink.closed:
+            super().close()
+            self._writer.close()
+            self._sink.close()
+
+# Trace file -> DataFrame; a truncated Arrow stream yields its complete batches
+def read_trace(path):
+    import pandas as pd
+    if not str(path).endswith((".arrow", ".arrows")):
+        return pd.read_csv(path)
+    import pyarrow as pa
+    batches = []
+    with pa.OSFile(str(path), "rb") as f:
+        reader = pa.ipc.open_stream(f)
+        try:
+            for batch in reader:
+                batches.append(batch)
+        except (pa.ArrowInvalid, OSError):
+            pass
+        return pa.Table.from_batches(batches, schema=reader.schema).to_pandas()